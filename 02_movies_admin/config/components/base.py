@@ -24,10 +24,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'movies.apps.MoviesConfig',
 ]
 
 MIDDLEWARE = [
+    'config.middleware.SQLProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,3 +92,6 @@ STATICFILES_DIRS = [
 ]
 
 LOCALE_PATH = ['movies/locale']
+
+# a film work change form sends several fields per cast member
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
@@ -15,3 +15,15 @@ DATABASES = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # facet counts are shared by all workers, so that counts invalidated by one of them are not served by the others;
+    # the table is created by createcachetable after `manage.py migrate`
+    'facets': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'movies_facets_cache',
+    },
+}
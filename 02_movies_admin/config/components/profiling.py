@@ -0,0 +1,26 @@
+import os
+
+# SQL profiling of requests, see config.middleware.SQLProfilingMiddleware
+SQL_PROFILING = os.environ.get('SQL_PROFILING', 'False') == 'True'
+# share of requests whose queries are profiled; the rest only get the total time in Server-Timing
+SQL_PROFILING_SAMPLE_RATE = float(os.environ.get('SQL_PROFILING_SAMPLE_RATE', 0.05))
+SQL_PROFILING_SLOW_REQUEST_MS = int(os.environ.get('SQL_PROFILING_SLOW_REQUEST_MS', 1000))
+SQL_PROFILING_SLOW_QUERY_MS = int(os.environ.get('SQL_PROFILING_SLOW_QUERY_MS', 200))
+# a query shape repeated this many times within a request is reported as N+1
+SQL_PROFILING_REPEATED_QUERIES = int(os.environ.get('SQL_PROFILING_REPEATED_QUERIES', 10))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'config.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
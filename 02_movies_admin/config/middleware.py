@@ -0,0 +1,92 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Query shape: literals and parameter lists of any length are replaced, so that N+1 queries compare equal."""
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+class QueryProfile:
+    """execute_wrapper that counts queries, their time and shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            self.shapes[normalize(sql)] += 1
+            if elapsed * 1000 >= settings.SQL_PROFILING_SLOW_QUERY_MS:
+                self.slow.append((elapsed, sql))
+
+
+class SQLProfilingMiddleware:
+    """Adds a Server-Timing header and logs slow requests, slow queries and repeated query shapes.
+
+    Queries are profiled on a SQL_PROFILING_SAMPLE_RATE share of requests, the rest only get the total time.
+    Queries of a streaming response run after the middleware returns and are not counted.
+    Turned on with SQL_PROFILING, see config/components/profiling.py.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.SQL_PROFILING_SAMPLE_RATE:
+            response = self.get_response(request)
+            response['Server-Timing'] = 'app;dur={:.1f}'.format((time.perf_counter() - started) * 1000)
+            return response
+
+        profile = QueryProfile()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = profile.seconds * 1000
+        response['Server-Timing'] = 'app;dur={:.1f}, db;dur={:.1f};desc="{} queries"'.format(
+            total_ms, db_ms, profile.count)
+        self.report(request, profile, total_ms, db_ms)
+        return response
+
+    @staticmethod
+    def report(request, profile, total_ms, db_ms):
+        if total_ms >= settings.SQL_PROFILING_SLOW_REQUEST_MS:
+            logger.warning('Slow request %s %s: %.0f ms, %s queries in %.0f ms',
+                           request.method, request.path, total_ms, profile.count, db_ms)
+        for elapsed, sql in profile.slow:
+            logger.warning('Slow query in %s %s: %.0f ms: %s', request.method, request.path, elapsed * 1000, sql)
+        for shape, count in profile.shapes.most_common():
+            if count < settings.SQL_PROFILING_REPEATED_QUERIES:
+                break
+            logger.warning('Repeated query in %s %s: %s times: %s', request.method, request.path, count, shape)
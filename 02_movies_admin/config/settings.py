@@ -3,5 +3,6 @@ from split_settings.tools import include, optional
 include(
     'components/base.py',
     'components/database.py',
+    'components/profiling.py',
     optional('local_settings.py')
 )
@@ -1,16 +1,39 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from .export import CONTENT_TYPES, CSV, JSONL, render
+from .facets import BUCKETS, BUCKET_SIZE, bucket_range, facet_counts, filter_bucket
+from .forms import (
+    BulkInlineForm,
+    BulkInlineFormSet,
+    PrefetchedModelChoiceField,
+    PrefetchedRawIdFormSet,
+    PrefetchedRawIdWidget,
+)
 from .models import Genre, Filmwork, GenreFilmwork, Person, PersonFilmWork
+from .paginator import EstimatedCountPaginator
+from .search import FullTextSearchMixin, RankedChangeList, TrigramSearchMixin
 from django.utils.translation import gettext_lazy as _
 
 
 @admin.register(Genre)
-class GenreAdmin(admin.ModelAdmin):
+class GenreAdmin(TrigramSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'description',)
 
-    search_fields = ('title', 'description', 'id')
+    search_fields = ('name',)
+    trigram_field = 'name'
 
 
-class GenreFilmworkInline(admin.TabularInline):
+class BulkInline(admin.TabularInline):
+    form = BulkInlineForm
+    formset = BulkInlineFormSet
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        kwargs.setdefault('form_class', PrefetchedModelChoiceField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class GenreFilmworkInline(BulkInline):
     model = GenreFilmwork
     extra = 0
 
@@ -18,8 +41,20 @@ class GenreFilmworkInline(admin.TabularInline):
     verbose_name_plural = _('genres')
     ordering = ('genre__name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('genre')
 
-class PersonFilmworkInline(admin.TabularInline):
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'genre':
+            # every inline row renders the same genre list: query it once per request
+            if not hasattr(request, '_genre_choices'):
+                request._genre_choices = [(str(value), label) for value, label in field.choices]
+            field.choices = request._genre_choices
+        return field
+
+
+class PersonFilmworkInline(BulkInline):
     model = PersonFilmWork
     extra = 0
 
@@ -27,9 +62,18 @@ class PersonFilmworkInline(admin.TabularInline):
     verbose_name_plural = _('persons')
 
     raw_id_fields = ('person',)
+    formset = PrefetchedRawIdFormSet
 
     ordering = ('role', 'person__full_name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('person')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'person':
+            kwargs['widget'] = PrefetchedRawIdWidget(db_field.remote_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 class RatingListFilter(admin.SimpleListFilter):
     title = _('rating')
@@ -37,31 +81,86 @@ class RatingListFilter(admin.SimpleListFilter):
     parameter_name = 'rating'
 
     def lookups(self, request, model_admin):
-        return ((str(k * 10), '{}-{}'.format(k * 10, k * 10 + 10)) for k in range(10))
+        counts = facet_counts(request)['rating']
+        for bucket in range(BUCKETS):
+            low, high = bucket_range(bucket)
+            yield str(low), '{}-{} ({})'.format(low, high, counts.get(bucket, 0))
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return filter_bucket(queryset, int(self.value()) // BUCKET_SIZE)
+
+
+class TypeListFilter(admin.SimpleListFilter):
+    title = _('type')
+
+    # the parameter of the field filter it replaces, so that existing filter links keep working
+    parameter_name = 'type__exact'
+
+    def lookups(self, request, model_admin):
+        counts = facet_counts(request)['type']
+        return (
+            (value, '{} ({})'.format(label, counts.get(value, 0))) for value, label in Filmwork.FilmworkType.choices
+        )
 
     def queryset(self, request, queryset):
         if self.value():
-            rate = int(self.value())
-            return queryset.filter(rating__gte=rate, rating__lte=rate + 10)
+            return queryset.filter(type=self.value())
+
+
+class FilmworkChangeList(RankedChangeList):
+    def get_queryset(self, request):
+        # the list page shows only list_display columns, description can be large
+        return super().get_queryset(request).only(*self.model_admin.list_display)
 
 
 @admin.register(Filmwork)
-class FilmworkAdmin(admin.ModelAdmin):
+class FilmworkAdmin(FullTextSearchMixin, admin.ModelAdmin):
     inlines = (GenreFilmworkInline, PersonFilmworkInline,)
 
     list_display = ('title', 'type', 'creation_date', 'rating',)
 
-    list_filter = ('type', RatingListFilter,)
+    list_filter = (TypeListFilter, RatingListFilter,)
 
     search_fields = ('title', 'description', 'id',)
 
     save_on_top = True
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    actions = ('export_csv', 'export_jsonl',)
+
+    def get_changelist(self, request, **kwargs):
+        return FilmworkChangeList
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ValidationError as error:
+            # raised by BulkInlineFormSet.save, the whole change is already rolled back
+            self.message_user(request, ' '.join(error.messages), messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
     def save_related(self, request, form, formsets, change):
         form.save_m2m()
         for formset in formsets:
             self.save_formset(request, form, formset, change=change)
 
+    @staticmethod
+    def export(queryset, export_format):
+        response = StreamingHttpResponse(render(queryset, export_format), content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = 'attachment; filename="filmworks.{}"'.format(export_format)
+        return response
+
+    @admin.action(description=_('Export to CSV'))
+    def export_csv(self, request, queryset):
+        return self.export(queryset, CSV)
+
+    @admin.action(description=_('Export to JSONL'))
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, JSONL)
+
     class Media:
         css = {
             'all': (
@@ -71,6 +170,7 @@ class FilmworkAdmin(admin.ModelAdmin):
 
 
 @admin.register(Person)
-class PersonAdmin(admin.ModelAdmin):
+class PersonAdmin(TrigramSearchMixin, admin.ModelAdmin):
     list_display = ('full_name',)
     search_fields = ('full_name',)
+    trigram_field = 'full_name'
@@ -0,0 +1,82 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import GenreFilmwork, PersonFilmWork
+
+CHUNK_SIZE = 2000
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+CONTENT_TYPES = {CSV: 'text/csv', JSONL: 'application/x-ndjson'}
+FIELDS = ('id', 'title', 'description', 'creation_date', 'rating', 'type', 'created', 'modified')
+ROLES = PersonFilmWork.RoleType.values
+
+
+def add_links(chunk):
+    """Adds genre names and person names by role to a chunk of film works in two queries."""
+    ids = [filmwork['id'] for filmwork in chunk]
+    genres = defaultdict(list)
+    for film_work_id, name in GenreFilmwork.objects.filter(film_work_id__in=ids).order_by(
+            'genre__name').values_list('film_work_id', 'genre__name'):
+        genres[film_work_id].append(name)
+    persons = defaultdict(lambda: {role: [] for role in ROLES})
+    for film_work_id, role, name in PersonFilmWork.objects.filter(film_work_id__in=ids, role__isnull=False).order_by(
+            'person__full_name').values_list('film_work_id', 'role', 'person__full_name'):
+        persons[film_work_id][role].append(name)
+    for filmwork in chunk:
+        filmwork['genres'] = genres[filmwork['id']]
+        filmwork['persons'] = persons[filmwork['id']]
+    return chunk
+
+
+def export_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Film works of the queryset with their links, chunk_size at a time.
+
+    Film works are read by a server-side cursor inside a transaction (so the cursor is not materialized
+    WITH HOLD), links are fetched per chunk; memory use does not depend on the size of the queryset.
+    """
+    with transaction.atomic(using=queryset.db):
+        chunk = []
+        for filmwork in queryset.values(*FIELDS).iterator(chunk_size=chunk_size):
+            chunk.append(filmwork)
+            if len(chunk) == chunk_size:
+                yield add_links(chunk)
+                chunk = []
+        if chunk:
+            yield add_links(chunk)
+
+
+class Echo:
+    """File-like object for csv.writer that returns the written line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS + ('genres',) + tuple(ROLES))
+    for chunk in chunks:
+        yield ''.join(
+            writer.writerow(
+                [filmwork[name] for name in FIELDS]
+                + [', '.join(filmwork['genres'])]
+                + [', '.join(filmwork['persons'][role]) for role in ROLES]
+            )
+            for filmwork in chunk
+        )
+
+
+def jsonl_lines(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(filmwork, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for filmwork in chunk)
+
+
+def render(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """Export of the queryset in CSV or JSONL as an iterator of strings, one per chunk."""
+    chunks = export_chunks(queryset, chunk_size)
+    return csv_lines(chunks) if export_format == CSV else jsonl_lines(chunks)
@@ -0,0 +1,57 @@
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Floor, Least
+
+from .models import Filmwork
+
+BUCKET_SIZE = 10
+BUCKETS = 10
+CACHE_KEY = 'movies:filmwork_facets'
+CACHE_ALIAS = 'facets'
+CACHE_TIMEOUT = 600
+
+
+def bucket_range(bucket):
+    """Half-open rating range [low, high) of a bucket; the last bucket also takes the maximum rating."""
+    low = bucket * BUCKET_SIZE
+    return low, low + BUCKET_SIZE
+
+
+def filter_bucket(queryset, bucket):
+    low, high = bucket_range(bucket)
+    if bucket == BUCKETS - 1:
+        return queryset.filter(rating__gte=low, rating__lte=high)
+    return queryset.filter(rating__gte=low, rating__lt=high)
+
+
+def compute_facets():
+    """Film work counts by type and by rating bucket, in one grouped query."""
+    bucket = Least(Floor(F('rating') / BUCKET_SIZE), Value(BUCKETS - 1, output_field=FloatField()))
+    rows = Filmwork.objects.order_by().annotate(bucket=bucket).values('type', 'bucket').annotate(count=Count('*'))
+    facets = {'type': {}, 'rating': {}}
+    for row in rows:
+        facets['type'][row['type']] = facets['type'].get(row['type'], 0) + row['count']
+        if row['bucket'] is not None:
+            facets['rating'][int(row['bucket'])] = facets['rating'].get(int(row['bucket']), 0) + row['count']
+    return facets
+
+
+def facet_counts(request=None):
+    """Cached facet counts; read from the cache once per request, as both list filters need them."""
+    if request is None:
+        return caches[CACHE_ALIAS].get_or_set(CACHE_KEY, compute_facets, CACHE_TIMEOUT)
+    if not hasattr(request, '_facet_counts'):
+        request._facet_counts = caches[CACHE_ALIAS].get_or_set(CACHE_KEY, compute_facets, CACHE_TIMEOUT)
+    return request._facet_counts
+
+
+def invalidate_facets():
+    """Drops the cached counts after the current transaction commits.
+
+    Called on film work saves and deletes through the ORM and by import_catalog. Writes that bypass Django
+    (03_sqlite_to_postgres load_data.py and snapshot.py) do not invalidate the counts: they are refreshed
+    within CACHE_TIMEOUT, or at once with `manage.py invalidate_facets`.
+    """
+    # after commit, so that a concurrent request does not cache counts of the old data again
+    transaction.on_commit(lambda: caches[CACHE_ALIAS].delete(CACHE_KEY))
@@ -0,0 +1,181 @@
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import IntegrityError, router, transaction
+from django.forms import ModelChoiceField, ModelForm
+from django.forms.models import BaseInlineFormSet
+from django.urls import NoReverseMatch, reverse
+from django.utils.text import Truncator
+
+
+class PrefetchedRawIdWidget(ForeignKeyRawIdWidget):
+    """Raw id widget that takes the related object from `objects` (set by the formset) instead of a query per row."""
+
+    objects = None
+
+    def label_and_url_for_value(self, value):
+        obj = self.objects.get(str(value)) if self.objects else None
+        if obj is None:
+            return super().label_and_url_for_value(value)
+        try:
+            url = reverse(
+                '%s:%s_%s_change' % (self.admin_site.name, obj._meta.app_label, obj._meta.model_name),
+                args=(obj.pk,),
+            )
+        except NoReverseMatch:
+            url = ''
+        return Truncator(obj).words(14), url
+
+
+class PrefetchedModelChoiceField(ModelChoiceField):
+    """Takes submitted objects from `objects`, filled by BulkInlineFormSet with one query for all rows."""
+
+    objects = None
+
+    def to_python(self, value):
+        if self.objects is not None and value not in self.empty_values:
+            obj = self.objects.get(str(value))
+            if obj is not None:
+                return obj
+        return super().to_python(value)
+
+
+class BulkInlineForm(ModelForm):
+    """Inline form without per-row queries in validation.
+
+    Related objects of PrefetchedModelChoiceField are not checked again by the model field,
+    and unique constraints are checked by BulkInlineFormSet across all rows at once.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        exclude.extend(name for name, field in self.fields.items() if isinstance(field, PrefetchedModelChoiceField))
+        return exclude
+
+    def validate_unique(self):
+        pass
+
+
+class BulkInlineFormSet(BaseInlineFormSet):
+    """Inline formset that saves all rows with one delete, one bulk_update and one bulk_create.
+
+    Unique constraints are checked across the submitted rows in memory (the rows of an inline are all
+    the rows of the parent object), the database constraints catch the rest. Objects submitted
+    to PrefetchedModelChoiceField fields, the primary key included, are fetched with one query per field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._submitted_objects = {}
+
+    def submitted_objects(self, name, field):
+        if name not in self._submitted_objects:
+            opts = field.queryset.model._meta
+            key = opts.get_field(field.to_field_name) if field.to_field_name else opts.pk
+            values = set()
+            for i in range(self.total_form_count()):
+                value = self.data.get('{}-{}'.format(self.add_prefix(i), name))
+                if value not in field.empty_values:
+                    try:
+                        values.add(key.to_python(value))
+                    except ValidationError:
+                        pass
+            objects = field.queryset.in_bulk(values, field_name=key.name) if values else {}
+            self._submitted_objects[name] = {str(value): obj for value, obj in objects.items()}
+        return self._submitted_objects[name]
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields.get(name)
+        if isinstance(field, ModelChoiceField) and not isinstance(field, PrefetchedModelChoiceField):
+            form.fields[name] = PrefetchedModelChoiceField(
+                field.queryset, initial=field.initial, required=False, widget=field.widget,
+            )
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if self.is_bound:
+            for name, field in form.fields.items():
+                if isinstance(field, PrefetchedModelChoiceField):
+                    field.objects = self.submitted_objects(name, field)
+        return form
+
+    def validate_unique(self):
+        opts = self.model._meta
+        forms = [form for form in self.forms if form.is_valid() and form not in self.deleted_forms]
+        for constraint in opts.total_unique_constraints:
+            attnames = [opts.get_field(name).attname for name in constraint.fields]
+            seen = set()
+            for form in forms:
+                row = tuple(getattr(form.instance, attname) for attname in attnames)
+                if None in row:
+                    continue
+                if row in seen:
+                    form._errors[NON_FIELD_ERRORS] = self.error_class([self.get_form_error()])
+                    raise ValidationError(self.get_unique_error_message(constraint.fields))
+                seen.add(row)
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        self.new_objects, self.changed_objects, self.deleted_objects = [], [], []
+        changed_fields = set()
+        for form in self.initial_forms:
+            obj = form.instance
+            if obj.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                self.deleted_objects.append(obj)
+            elif form.has_changed():
+                self.changed_objects.append((self.save_existing(form, obj, commit=False), form.changed_data))
+                changed_fields.update(form.changed_data)
+        for form in self.extra_forms:
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form)):
+                self.new_objects.append(self.save_new(form, commit=False))
+
+        update_fields = sorted(changed_fields & {
+            field.name for field in self.model._meta.concrete_fields if not field.primary_key
+        })
+        manager = self.model._default_manager
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                # deletes go first, so that a row may take the values of a deleted one
+                if self.deleted_objects:
+                    manager.filter(pk__in=[obj.pk for obj in self.deleted_objects]).delete()
+                if self.changed_objects and update_fields:
+                    manager.bulk_update([obj for obj, _ in self.changed_objects], update_fields)
+                if self.new_objects:
+                    manager.bulk_create(self.new_objects)
+        except IntegrityError as error:
+            # validate_unique only sees the submitted rows, a concurrent edit can still break a constraint
+            self._non_form_errors = self.error_class([
+                'Could not save {}: {}'.format(self.model._meta.verbose_name_plural, str(error).splitlines()[0]),
+            ])
+            raise ValidationError(self._non_form_errors)
+        return self.new_objects + [obj for obj, _ in self.changed_objects]
+
+
+class PrefetchedRawIdFormSet(BulkInlineFormSet):
+    """Passes related objects of the formset queryset to PrefetchedRawIdWidget fields.
+
+    The inline's get_queryset should select_related these fields, then rendering takes no query per row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._related_objects = {}
+
+    def related_objects(self, name):
+        if name not in self._related_objects:
+            attname = self.model._meta.get_field(name).attname
+            self._related_objects[name] = {
+                str(getattr(obj, attname)): getattr(obj, name) for obj in self.get_queryset()
+            }
+        return self._related_objects[name]
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        for name, field in form.fields.items():
+            if isinstance(field.widget, PrefetchedRawIdWidget):
+                field.widget.objects = self.related_objects(name)
+        return form
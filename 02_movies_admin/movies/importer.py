@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+import uuid
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .export import FIELDS, JSONL, ROLES
+from .facets import invalidate_facets
+from .models import Filmwork, Genre, Person, PersonFilmWork
+
+CHUNK_SIZE = 10000
+# namespace of ids derived from natural keys, so that importing the same file twice does not duplicate rows
+NAMESPACE = uuid.UUID('5c0b7c3e-4f39-4a5e-9d1f-2b8f3f0c6a71')
+FILMWORK_FIELDS = tuple(name for name in FIELDS if name not in ('id', 'created', 'modified'))
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# inside an outer transaction the tables of the previous chunk are still there, so they are emptied
+STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS import_genre (id uuid, name text) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS import_person (id uuid, full_name text) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS import_film_work (
+    id uuid, title text, description text, creation_date date, rating float8, type text
+) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS import_genre_film_work (id uuid, film_work_id uuid, genre_id uuid) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS import_person_film_work (
+    id uuid, film_work_id uuid, person_id uuid, role text
+) ON COMMIT DROP;
+TRUNCATE import_genre, import_person, import_film_work, import_genre_film_work, import_person_film_work;
+"""
+
+MERGE_NAMES = """
+INSERT INTO content.genre (id, name, created, modified)
+SELECT id, name, now(), now() FROM import_genre
+ON CONFLICT (id) DO NOTHING;
+INSERT INTO content.person (id, full_name, created, modified)
+SELECT id, full_name, now(), now() FROM import_person
+ON CONFLICT (id) DO NOTHING;
+"""
+
+MERGE_FILMWORKS = """
+WITH applied AS (
+    INSERT INTO content.film_work AS target (id, title, description, creation_date, rating, type, created, modified)
+    SELECT DISTINCT ON (id) id, title, description, creation_date, rating, type, now(), now()
+    FROM import_film_work
+    ORDER BY id
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title, description = EXCLUDED.description, creation_date = EXCLUDED.creation_date,
+        rating = EXCLUDED.rating, type = EXCLUDED.type, modified = now()
+    WHERE (target.title, target.description, target.creation_date, target.rating, target.type)
+        IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.description, EXCLUDED.creation_date, EXCLUDED.rating, EXCLUDED.type)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM applied
+"""
+
+MERGE_LINKS = """
+INSERT INTO content.genre_film_work (id, film_work_id, genre_id, created)
+SELECT id, film_work_id, genre_id, now() FROM import_genre_film_work
+ON CONFLICT (film_work_id, genre_id) DO NOTHING;
+INSERT INTO content.person_film_work (id, film_work_id, person_id, role, created)
+SELECT id, film_work_id, person_id, role, now() FROM import_person_film_work
+ON CONFLICT (film_work_id, person_id, role) DO NOTHING;
+"""
+
+
+def natural_id(kind, *parts):
+    return uuid.uuid5(NAMESPACE, '\x1f'.join((kind,) + tuple(str(part) for part in parts)))
+
+
+def ids_by_name(rows):
+    ids = defaultdict(list)
+    for name, pk in rows:
+        ids[name].append(pk)
+    return ids
+
+
+def split_names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def names_list(value, what):
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError('{} must be a list of names'.format(what))
+    return value
+
+
+def read_records(stream, import_format):
+    """Records of a CSV or JSONL file in the format of movies.export, with their line numbers.
+
+    JSONL lines are parsed later, with the rest of the record validation, so that a malformed line is reported
+    like any other invalid record.
+    """
+    if import_format == JSONL:
+        for line, text in enumerate(stream, 1):
+            if text.strip():
+                yield line, text
+        return
+    reader = csv.DictReader(stream)
+    for record in reader:
+        record['genres'] = split_names(record.get('genres'))
+        record['persons'] = {role: split_names(record.pop(role, None)) for role in ROLES}
+        yield reader.line_num, record
+
+
+def copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join('\\N' if value is None else str(value).translate(COPY_ESCAPES) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(table, ', '.join(columns)), buffer)
+
+
+class CatalogImporter:
+    """Imports film works with their genres and persons through staging tables, chunk_size records at a time.
+
+    Genres and persons are resolved by name with maps loaded once; unknown ones get ids derived
+    from the name, and a name shared by several existing rows makes the record invalid. Records are validated
+    with the model fields (choices, validators, max_length) without saving objects one by one; invalid records
+    are skipped and listed in `errors`.
+    Each chunk is copied into temporary tables and merged in one transaction: film works are inserted or
+    updated when they differ, links are added.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.genres = ids_by_name(Genre.objects.values_list('name', 'id'))
+        self.persons = ids_by_name(Person.objects.values_list('full_name', 'id'))
+        self.stats = Counter()
+        self.errors = []
+
+    def run(self, stream, import_format=JSONL):
+        chunk = []
+        for line, record in read_records(stream, import_format):
+            chunk.append((line, record))
+            if len(chunk) == self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        invalidate_facets()
+        return self.stats
+
+    @staticmethod
+    def clean_value(model, name, value):
+        field = model._meta.get_field(name)
+        if value == '' and field.null:
+            value = None
+        return field.clean(value, None)
+
+    def resolve(self, names, known, new, model, field, kind):
+        ids = []
+        for name in names:
+            if name not in known:
+                self.clean_value(model, field, name)
+                new[name] = natural_id(kind, name)
+                known[name] = [new[name]]
+            if len(known[name]) > 1:
+                raise ValidationError('{} "{}" is ambiguous: {} records have this name'.format(
+                    kind, name, len(known[name])))
+            ids.append(known[name][0])
+        return ids
+
+    @staticmethod
+    def parse(record):
+        if isinstance(record, str):
+            record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError('a record must be a JSON object')
+        return record
+
+    def import_chunk(self, chunk):
+        filmworks, genre_links, person_links = [], [], []
+        new_genres, new_persons = {}, {}
+        for line, record in chunk:
+            try:
+                record = self.parse(record)
+                values = {name: self.clean_value(Filmwork, name, record.get(name)) for name in FILMWORK_FIELDS}
+                if record.get('id'):
+                    pk = self.clean_value(Filmwork, 'id', record['id'])
+                else:
+                    pk = natural_id('filmwork', values['title'], values['type'], values['creation_date'])
+                genres = self.resolve(
+                    names_list(record.get('genres') or [], 'genres'), self.genres, new_genres, Genre, 'name', 'genre')
+                roles = record.get('persons') or {}
+                if not isinstance(roles, dict):
+                    raise ValueError('persons must be an object of names by role')
+                persons = []
+                for role, names in roles.items():
+                    role = self.clean_value(PersonFilmWork, 'role', role)
+                    persons += [(person, role) for person in self.resolve(
+                        names_list(names, role), self.persons, new_persons, Person, 'full_name', 'person')]
+            except (ValidationError, TypeError, ValueError) as er:
+                self.errors.append((line, er.messages if isinstance(er, ValidationError) else [str(er)]))
+                continue
+            filmworks.append((pk, *values.values()))
+            genre_links += [(uuid.uuid4(), pk, genre) for genre in genres]
+            person_links += [(uuid.uuid4(), pk, person, role) for person, role in persons]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(STAGING)
+            copy_rows(cursor, 'import_genre', ('id', 'name'), ((pk, name) for name, pk in new_genres.items()))
+            copy_rows(cursor, 'import_person', ('id', 'full_name'), ((pk, name) for name, pk in new_persons.items()))
+            copy_rows(cursor, 'import_film_work', ('id',) + FILMWORK_FIELDS, filmworks)
+            copy_rows(cursor, 'import_genre_film_work', ('id', 'film_work_id', 'genre_id'), genre_links)
+            copy_rows(cursor, 'import_person_film_work', ('id', 'film_work_id', 'person_id', 'role'), person_links)
+            cursor.execute(MERGE_NAMES)
+            cursor.execute(MERGE_FILMWORKS)
+            inserted, updated = cursor.fetchone()
+            cursor.execute(MERGE_LINKS)
+        self.stats.update({
+            'read': len(chunk),
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': len(filmworks) - inserted - updated,
+            'genres': len(new_genres),
+            'persons': len(new_persons),
+        })
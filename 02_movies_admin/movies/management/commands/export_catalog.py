@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from movies.export import CHUNK_SIZE, FORMATS, JSONL, render
+from movies.models import Filmwork
+
+
+class Command(BaseCommand):
+    help = 'Export film works with their genres and persons as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default=JSONL)
+        parser.add_argument('--output', help='file to write to, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = Filmwork.objects.order_by('id')
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for part in render(queryset, options['format'], options['chunk_size']):
+                output.write(part)
+        finally:
+            if output is not sys.stdout:
+                output.close()
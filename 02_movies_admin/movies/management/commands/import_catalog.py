@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from movies.export import CSV, FORMATS, JSONL
+from movies.importer import CHUNK_SIZE, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Import film works with their genres and persons from a CSV or JSONL file in the export_catalog format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='by the file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        import_format = options['format'] or (CSV if path.suffix.lower() == '.csv' else JSONL)
+        importer = CatalogImporter(options['chunk_size'])
+        with open(path, encoding='utf-8', newline='') as stream:
+            stats = importer.run(stream, import_format)
+        for line, messages in importer.errors:
+            self.stderr.write('line {}: {}'.format(line, ' '.join(messages)))
+        self.stdout.write(', '.join('{} {}'.format(count, name) for name, count in stats.items()))
+        self.stdout.write('{} skipped'.format(len(importer.errors)))
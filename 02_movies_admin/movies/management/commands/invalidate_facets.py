@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from movies.facets import invalidate_facets
+
+
+class Command(BaseCommand):
+    help = 'Drop the cached film work facet counts, e.g. after a load that bypassed Django'
+
+    def handle(self, *args, **options):
+        invalidate_facets()
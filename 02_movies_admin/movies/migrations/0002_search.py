@@ -0,0 +1,59 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='filmwork',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=f"""
+            CREATE FUNCTION content.film_work_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {SEARCH_VECTOR};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER film_work_search_vector
+            BEFORE INSERT OR UPDATE OF title, description ON content.film_work
+            FOR EACH ROW EXECUTE FUNCTION content.film_work_search_vector();
+
+            UPDATE content.film_work SET title = title;
+            """,
+            reverse_sql="""
+            DROP TRIGGER film_work_search_vector ON content.film_work;
+            DROP FUNCTION content.film_work_search_vector();
+            """,
+        ),
+        migrations.AddIndex(
+            model_name='filmwork',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_work_search_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX person_full_name_trgm_idx ON content.person USING gin (UPPER(full_name::text) gin_trgm_ops);
+            CREATE INDEX genre_name_trgm_idx ON content.genre USING gin (UPPER(name::text) gin_trgm_ops);
+            """,
+            reverse_sql="""
+            DROP INDEX content.person_full_name_trgm_idx;
+            DROP INDEX content.genre_name_trgm_idx;
+            """,
+        ),
+    ]
@@ -1,5 +1,7 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -67,6 +69,8 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
     type = models.CharField(_('type'), choices=FilmworkType.choices, max_length=7)
     persons = models.ManyToManyField(Person, through='PersonFilmWork', verbose_name=_('persons'))
     genres = models.ManyToManyField(Genre, through='GenreFilmwork', verbose_name=_('genre'))
+    # filled from title and description by a trigger, see migration 0002_search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         db_table = "content\".\"film_work"
@@ -74,6 +78,9 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
         verbose_name_plural = _('filmworks')
         indexes = [
             models.Index(fields=['creation_date'], name='film_work_creation_date_idx'),
+            models.Index(fields=['rating'], name='film_work_rating_idx'),
+            models.Index(fields=['modified', 'id'], name='film_work_modified_id_idx'),
+            GinIndex(fields=['search_vector'], name='film_work_search_idx'),
         ]
 
     def __str__(self):
@@ -91,7 +98,7 @@ class GenreFilmwork(UUIDMixin, CreatedAtMixin):
         ]
 
     def __str__(self):
-        return str(self.genre.id)
+        return str(self.genre_id)
 
 
 class PersonFilmWork(UUIDMixin, CreatedAtMixin):
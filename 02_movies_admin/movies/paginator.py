@@ -0,0 +1,37 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the row count from Postgres statistics instead of COUNT(*) on large tables.
+
+    An unfiltered queryset is counted by pg_class.reltuples, a filtered one by the planner's row estimate.
+    Estimates below `threshold` are replaced with an exact count, so small tables and narrow filters
+    still get exact page numbers.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is None or estimate < self.threshold:
+            return super().count
+        return estimate
+
+    def estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            return cursor.fetchone()[0][0]['Plan']['Plan Rows']
@@ -0,0 +1,48 @@
+import uuid
+
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import F, FloatField, Value
+
+SEARCH_CONFIG = 'english'
+
+
+class RankedChangeList(ChangeList):
+    """Orders search results by the `rank` annotation unless the user sorts by a column."""
+
+    def get_ordering(self, request, queryset):
+        if self.query.strip() and ORDER_VAR not in self.params:
+            return ['-rank', '-pk']
+        return super().get_ordering(request, queryset)
+
+
+class RankedSearchMixin:
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
+
+
+class FullTextSearchMixin(RankedSearchMixin):
+    """Searches the `search_vector` column (GIN index); a UUID search term finds the object by id."""
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            pk = uuid.UUID(search_term)
+        except ValueError:
+            query = SearchQuery(search_term, config=SEARCH_CONFIG, search_type='websearch')
+            return queryset.filter(search_vector=query).annotate(rank=SearchRank(F('search_vector'), query)), False
+        return queryset.filter(pk=pk).annotate(rank=Value(1.0, output_field=FloatField())), False
+
+
+class TrigramSearchMixin(RankedSearchMixin):
+    """The default icontains search, served by trigram indexes on UPPER(field), ranked by similarity."""
+
+    trigram_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip():
+            queryset = queryset.annotate(rank=TrigramSimilarity(self.trigram_field, search_term.strip()))
+        return queryset, may_have_duplicates
@@ -0,0 +1,26 @@
+from django.core.management import call_command
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .facets import invalidate_facets
+from .models import Filmwork
+
+
+@receiver(post_save, sender=Filmwork)
+@receiver(post_delete, sender=Filmwork)
+def filmwork_changed(sender, **kwargs):
+    invalidate_facets()
+
+
+def create_cache_tables(sender, using, **kwargs):
+    """Creates the table of the database cache of facet counts after migrations, so that no separate step is needed."""
+    call_command('createcachetable', database=using, verbosity=0)
+
+
+def create_content_schema(sender, using, **kwargs):
+    """Creates the content schema of the movies tables before migrations run, e.g. in a new test database."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE SCHEMA IF NOT EXISTS content')
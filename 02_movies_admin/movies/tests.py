@@ -0,0 +1,281 @@
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from config.middleware import SQLProfilingMiddleware
+
+from .export import JSONL
+from .importer import CatalogImporter
+from .models import Filmwork, Genre, GenreFilmwork, Person, PersonFilmWork
+
+
+def inline_data(prefix, rows):
+    data = {
+        '{}-TOTAL_FORMS'.format(prefix): len(rows),
+        '{}-INITIAL_FORMS'.format(prefix): len(rows),
+        '{}-MIN_NUM_FORMS'.format(prefix): 0,
+        '{}-MAX_NUM_FORMS'.format(prefix): 1000,
+    }
+    for i, row in enumerate(rows):
+        data.update(('{}-{}-{}'.format(prefix, i, name), value) for name, value in row.items())
+    return data
+
+
+class FilmworkChangeViewQueriesTest(TestCase):
+    """The film work change form is shown and saved in the same number of queries whatever the size of its inlines."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.genres = Genre.objects.bulk_create(Genre(name='genre {}'.format(i)) for i in range(20))
+
+    def create_filmwork(self, persons, genres):
+        filmwork = Filmwork.objects.create(title='filmwork', type=Filmwork.FilmworkType.MOVIE)
+        cast = Person.objects.bulk_create(Person(full_name='person {}'.format(i)) for i in range(persons))
+        PersonFilmWork.objects.bulk_create(
+            PersonFilmWork(film_work=filmwork, person=person, role=PersonFilmWork.RoleType.ACTOR) for person in cast
+        )
+        GenreFilmwork.objects.bulk_create(
+            GenreFilmwork(film_work=filmwork, genre=genre) for genre in self.genres[:genres]
+        )
+        return filmwork
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # warm up per-process caches such as content types
+        self.change_view_queries(self.create_filmwork(persons=1, genres=1))
+
+    def change_view_queries(self, filmwork):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:movies_filmwork_change', args=(filmwork.pk,)))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def change_form_data(self, filmwork, role):
+        data = {'title': filmwork.title, 'type': filmwork.type, 'description': '', 'creation_date': '', 'rating': ''}
+        data.update(inline_data('genrefilmwork_set', [
+            {'id': link.pk, 'film_work': filmwork.pk, 'genre': link.genre_id}
+            for link in GenreFilmwork.objects.filter(film_work=filmwork)
+        ]))
+        data.update(inline_data('personfilmwork_set', [
+            {'id': link.pk, 'film_work': filmwork.pk, 'person': link.person_id, 'role': role}
+            for link in PersonFilmWork.objects.filter(film_work=filmwork)
+        ]))
+        return data
+
+    def save_queries(self, filmwork):
+        data = self.change_form_data(filmwork, PersonFilmWork.RoleType.WRITER)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin:movies_filmwork_change', args=(filmwork.pk,)), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(filmwork.personfilmwork_set.exclude(role=PersonFilmWork.RoleType.WRITER).exists())
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_inlines(self):
+        small = self.change_view_queries(self.create_filmwork(persons=1, genres=1))
+        large = self.change_view_queries(self.create_filmwork(persons=300, genres=20))
+        self.assertEqual(small, large)
+
+    def test_save_query_count_does_not_grow_with_inlines(self):
+        small = self.save_queries(self.create_filmwork(persons=1, genres=1))
+        large = self.save_queries(self.create_filmwork(persons=300, genres=20))
+        self.assertEqual(small, large)
+
+    def test_conflicting_save_is_reported(self):
+        filmwork = self.create_filmwork(persons=1, genres=1)
+        url = reverse('admin:movies_filmwork_change', args=(filmwork.pk,))
+        data = self.change_form_data(filmwork, PersonFilmWork.RoleType.ACTOR)
+        data.update({
+            'title': 'changed',
+            'genrefilmwork_set-TOTAL_FORMS': 2,
+            'genrefilmwork_set-1-film_work': filmwork.pk,
+            'genrefilmwork_set-1-genre': self.genres[1].pk,
+        })
+        # another editor adds the same genre after the form was shown
+        GenreFilmwork.objects.create(film_work=filmwork, genre=self.genres[1])
+        response = self.client.post(url, data, follow=True)
+        self.assertRedirects(response, url)
+        self.assertIn('Could not save', ' '.join(str(message) for message in response.context['messages']))
+        filmwork.refresh_from_db()
+        self.assertEqual(filmwork.title, 'filmwork')
+        self.assertEqual(filmwork.genrefilmwork_set.count(), 2)
+
+
+class FilmworkChangelistFilterTest(TestCase):
+    """The type filter shows facet counts and keeps the parameter of the default field filter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.movie = Filmwork.objects.create(title='movie', type=Filmwork.FilmworkType.MOVIE)
+        Filmwork.objects.create(title='show', type=Filmwork.FilmworkType.TV_SHOW)
+
+    def test_type_filter(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:movies_filmwork_changelist'), {'type__exact': 'movie'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.movie])
+        self.assertIn('description', response.context['cl'].result_list[0].get_deferred_fields())
+        self.assertContains(response, '?type__exact=tv_show')
+        self.assertContains(response, '(1)')
+
+
+class FilmworkAPITest(TestCase):
+    """The film work API pages by keyset cursor, answers conditional requests and lists links by id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='comedy')
+        cls.filmworks = [
+            Filmwork.objects.create(title='filmwork {}'.format(i), type=Filmwork.FilmworkType.MOVIE) for i in range(3)
+        ]
+        cls.namesakes = Person.objects.bulk_create(Person(full_name='John Smith') for _ in range(2))
+        PersonFilmWork.objects.bulk_create(
+            PersonFilmWork(film_work=cls.filmworks[0], person=person, role=PersonFilmWork.RoleType.ACTOR)
+            for person in cls.namesakes
+        )
+        GenreFilmwork.objects.create(film_work=cls.filmworks[0], genre=cls.genre)
+
+    def get_list(self, **params):
+        response = self.client.get(reverse('movies:filmwork_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def expected_ids(self):
+        return [str(pk) for pk in Filmwork.objects.order_by('modified', 'id').values_list('id', flat=True)]
+
+    def test_list(self):
+        page = self.get_list()
+        self.assertEqual([filmwork['id'] for filmwork in page['results']], self.expected_ids())
+        self.assertIsNone(page['next'])
+        filmwork = next(item for item in page['results'] if item['id'] == str(self.filmworks[0].pk))
+        self.assertEqual(filmwork['genres'], [{'id': str(self.genre.pk), 'name': 'comedy'}])
+        self.assertCountEqual(
+            filmwork['actors'], [{'id': str(person.pk), 'name': 'John Smith'} for person in self.namesakes],
+        )
+        self.assertEqual(filmwork['directors'], [])
+
+    def test_keyset_cursor(self):
+        first = self.get_list(limit=2)
+        self.assertEqual(len(first['results']), 2)
+        response = self.client.get(first['next'])
+        self.assertEqual(response.status_code, 200)
+        second = response.json()
+        self.assertIsNone(second['next'])
+        self.assertEqual(
+            [filmwork['id'] for filmwork in first['results'] + second['results']], self.expected_ids(),
+        )
+
+    def test_malformed_cursor(self):
+        for params in ({'after': 'not-a-cursor'}, {'after': 'bm90fGF8dXVpZA=='}, {'limit': 0}, {'limit': 'x'}):
+            response = self.client.get(reverse('movies:filmwork_list'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_etag(self):
+        url = reverse('movies:filmwork_detail', args=(self.filmworks[0].pk,))
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Filmwork.objects.filter(pk=self.filmworks[0].pk).update(title='renamed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CatalogImporterTest(TestCase):
+    """The catalog import merges film works with their links, reports invalid lines and can be rerun."""
+
+    RECORDS = [
+        {
+            'title': 'First', 'type': 'movie', 'rating': 8.5, 'creation_date': '2001-01-01',
+            'genres': ['comedy', 'drama'], 'persons': {'actor': ['John Smith'], 'director': ['Jane Doe']},
+        },
+        {'title': 'Second', 'type': 'tv_show', 'genres': ['drama'], 'persons': {'actor': ['John Smith']}},
+        {'title': 'Third', 'type': 'movie'},
+    ]
+
+    @staticmethod
+    def jsonl(records):
+        return ''.join(json.dumps(record) + '\n' for record in records)
+
+    @staticmethod
+    def run_import(text):
+        # two chunks, both inside the test transaction
+        importer = CatalogImporter(chunk_size=2)
+        return importer, importer.run(io.StringIO(text), JSONL)
+
+    @staticmethod
+    def counts():
+        return [model.objects.count() for model in (Filmwork, Genre, Person, GenreFilmwork, PersonFilmWork)]
+
+    def test_merge(self):
+        comedy = Genre.objects.create(name='comedy')
+        importer, stats = self.run_import(self.jsonl(self.RECORDS))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual((stats['inserted'], stats['genres'], stats['persons']), (3, 1, 2))
+        self.assertEqual(self.counts(), [3, 2, 2, 3, 3])
+        first = Filmwork.objects.get(title='First')
+        self.assertEqual(first.rating, 8.5)
+        self.assertIn(comedy, first.genres.all())
+        self.assertEqual(
+            set(first.personfilmwork_set.values_list('person__full_name', 'role')),
+            {('John Smith', 'actor'), ('Jane Doe', 'director')},
+        )
+
+    def test_malformed_lines(self):
+        text = ''.join((
+            self.jsonl(self.RECORDS[:1]),
+            '{not json\n',
+            '[1, 2]\n',
+            self.jsonl([
+                {'title': 'Bad', 'type': 'movie', 'persons': ['John Smith']},
+                {'title': 'Bad', 'type': 'cartoon'},
+                {'title': 'Bad', 'type': 'movie', 'genres': 'comedy'},
+            ]),
+            self.jsonl(self.RECORDS[1:2]),
+        ))
+        importer, stats = self.run_import(text)
+        self.assertEqual([line for line, messages in importer.errors], [2, 3, 4, 5, 6])
+        self.assertEqual(stats['inserted'], 2)
+        self.assertFalse(Filmwork.objects.filter(title='Bad').exists())
+
+    def test_ambiguous_name(self):
+        Person.objects.bulk_create(Person(full_name='John Smith') for _ in range(2))
+        importer, stats = self.run_import(self.jsonl(self.RECORDS))
+        self.assertEqual([line for line, messages in importer.errors], [1, 2])
+        self.assertIn('ambiguous', importer.errors[0][1][0])
+        self.assertEqual(list(Filmwork.objects.values_list('title', flat=True)), ['Third'])
+
+    def test_rerun(self):
+        self.run_import(self.jsonl(self.RECORDS))
+        counts = self.counts()
+        importer, stats = self.run_import(self.jsonl(self.RECORDS))
+        self.assertEqual((stats['inserted'], stats['updated'], stats['unchanged']), (0, 0, 3))
+        self.assertEqual(self.counts(), counts)
+
+        changed = [dict(self.RECORDS[0], rating=9.0)] + self.RECORDS[1:]
+        importer, stats = self.run_import(self.jsonl(changed))
+        self.assertEqual((stats['inserted'], stats['updated'], stats['unchanged']), (0, 1, 2))
+        self.assertEqual(Filmwork.objects.get(title='First').rating, 9.0)
+        self.assertEqual(self.counts(), counts)
+
+
+@override_settings(SQL_PROFILING=True, SQL_PROFILING_SAMPLE_RATE=1, SQL_PROFILING_REPEATED_QUERIES=3)
+class SQLProfilingMiddlewareTest(TestCase):
+    """Profiled requests get a Server-Timing header, and repeated query shapes are logged."""
+
+    def test_server_timing_and_repeated_queries(self):
+        def view(request):
+            for genre in Genre.objects.bulk_create(Genre(name='genre {}'.format(i)) for i in range(3)):
+                Filmwork.objects.filter(genres=genre).exists()
+            return HttpResponse()
+
+        with self.assertLogs('config.middleware', 'WARNING') as logs:
+            response = SQLProfilingMiddleware(view)(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertEqual(len([line for line in logs.output if 'Repeated query' in line and '3 times' in line]), 1)
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'movies'
+
+urlpatterns = [
+    path('v1/movies/', views.filmwork_list, name='filmwork_list'),
+    path('v1/movies/<uuid:pk>/', views.filmwork_detail, name='filmwork_detail'),
+]
@@ -0,0 +1,103 @@
+import base64
+import datetime
+import hashlib
+import json
+import uuid
+
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import JSONField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, JSONObject
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET
+
+from .models import Filmwork, GenreFilmwork, PersonFilmWork
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FIELDS = ('id', 'title', 'description', 'creation_date', 'rating', 'type', 'modified')
+
+
+def json_array(links, ordering, **fields):
+    """Links of the outer film work as a JSON array of objects with the given fields, empty if there are none."""
+    items = links.filter(film_work=OuterRef('pk')).values('film_work').annotate(
+        items=JSONBAgg(JSONObject(**fields), ordering=ordering),
+    ).values('items')
+    return Coalesce(Subquery(items), Value('[]'), output_field=JSONField())
+
+
+def with_links(queryset):
+    """Film works as dicts with their genres and persons by role as lists of {id, name}.
+
+    Each relation is aggregated in its own correlated subquery, so the link tables are never joined with each other.
+    """
+    persons = {
+        '{}s'.format(role): json_array(
+            PersonFilmWork.objects.filter(role=role), 'person__full_name', id='person_id', name='person__full_name',
+        )
+        for role in PersonFilmWork.RoleType.values
+    }
+    return queryset.values(*FIELDS).annotate(
+        genres=json_array(GenreFilmwork.objects.all(), 'genre__name', id='genre_id', name='genre__name'),
+        **persons,
+    )
+
+
+def encode_cursor(filmwork):
+    value = '{}|{}'.format(filmwork['modified'].isoformat(), filmwork['id'])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    modified, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.datetime.fromisoformat(modified), uuid.UUID(pk)
+
+
+def keyset_page(after, limit):
+    """A page of film works ordered by (modified, id) that starts after the cursor (modified, id).
+
+    The page ids are chosen in a subquery, so only they are joined with the link tables and aggregated.
+    """
+    ids = Filmwork.objects.order_by('modified', 'id')
+    if after is not None:
+        modified, pk = after
+        # modified__gte bounds the index scan on (modified, id), the rest skips the rows up to the cursor
+        ids = ids.filter(Q(modified__gte=modified) & (Q(modified__gt=modified) | Q(id__gt=pk)))
+    return with_links(Filmwork.objects.filter(id__in=ids.values('id')[:limit])).order_by('modified', 'id')
+
+
+def json_response(request, data):
+    """JSON response with an ETag of its content; a matching If-None-Match gets 304 Not Modified."""
+    content = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    etag = '"{}"'.format(hashlib.md5(content.encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+@require_GET
+def filmwork_list(request):
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+        after = decode_cursor(request.GET['after']) if 'after' in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest()
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return HttpResponseBadRequest()
+    results = list(keyset_page(after, limit))
+    next_page = None
+    if len(results) == limit:
+        next_page = '{}?{}'.format(request.path, urlencode({'limit': limit, 'after': encode_cursor(results[-1])}))
+    return json_response(request, {'results': results, 'next': next_page})
+
+
+@require_GET
+def filmwork_detail(request, pk):
+    filmwork = with_links(Filmwork.objects.filter(pk=pk)).first()
+    if filmwork is None:
+        raise Http404
+    return json_response(request, filmwork)
@@ -0,0 +1,273 @@
+"""Асинхронная запись в PostgreSQL через asyncpg: много пачек одновременно на небольшом пуле соединений.
+
+Пока одна пачка идёт по сети, остальные уже отправлены на других соединениях, поэтому при удалённом
+Postgres задержка сети перестаёт ограничивать скорость записи. Чтение из SQLite, состояние загрузки,
+режим bulk и водяные знаки остаются прежними (psycopg2, см. load_data.py). asyncpg нужен только этому модулю.
+
+Соединение с SQLite можно использовать только в создавшем его потоке, поэтому оно открывается, а пачки
+читаются в одном выделенном потоке чтения.
+"""
+import asyncio
+import datetime
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+
+import asyncpg
+from psycopg2.extensions import connection as _connection
+
+from batching import BatchSizer, report_batch_sizes
+from bulk import start_rebuild
+from converters import PYTHON, compile_converter
+from helpers import AUTO_MODE, COPY_MODE, INSERT_MODE, as_rows, counted, max_watermark, on_conflict, watermark_field
+from load_data import CLASSES, COMMIT_EVERY, FIELDS_MAPPING, get_loader, prepare
+from metrics import Metrics, WRITE
+from state import DONE, LoadState
+
+PG_TYPES = {
+    uuid.UUID: 'uuid',
+    str: 'text',
+    datetime.date: 'date',
+    datetime.datetime: 'timestamptz',
+    float: 'float8',
+}
+
+_DONE = object()
+
+
+def connect_params(pg_params: dict) -> dict:
+    """Параметры asyncpg из параметров psycopg2 (get_pg_params), включая options вида '-c name=value'."""
+    params = {
+        'database': pg_params.get('dbname'),
+        'user': pg_params.get('user'),
+        'password': pg_params.get('password'),
+        'host': pg_params.get('host'),
+        'port': int(pg_params.get('port') or 5432),
+    }
+    options = pg_params.get('options')
+    if options:
+        params['server_settings'] = dict(
+            item.strip().split('=', 1) for item in options.split('-c') if item.strip())
+    return params
+
+
+def text_size(rows) -> int:
+    """Объём пачки в байтах UTF-8 текстового представления - оценка, сравнимая с объёмом COPY у PostgresSaver."""
+    return sum(len(str(value).encode()) for row in rows for value in row if value is not None)
+
+
+@dataclass
+class AsyncPostgresSaver:
+    """То же, что PostgresSaver, но save_all_data - сопрограмма, и каждая пачка пишется в своей транзакции
+    на свободном соединении пула, так что несколько пачек могут записываться одновременно.
+
+    Пачка, как и для PostgresSaver, - кортежи из SQLiteLoader или датаклассы; значения приводятся к типам Python
+    (compile_converter с PYTHON) и передаются в двоичном формате: COPY через copy_records_to_table,
+    INSERT - одним unnest по массивам столбцов.
+    """
+    pool: asyncpg.Pool
+    mode: str = AUTO_MODE
+    update: bool = False
+    metrics: Metrics = None
+    stats: dict = field(default_factory=dict, init=False)
+    _writers: dict = field(default_factory=dict, init=False, repr=False)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False, repr=False)
+
+    async def save_all_data(self, cls: dataclass, data) -> int:
+        rows = as_rows(cls, data)
+        convert = compile_converter(cls, PYTHON)
+        records = rows if convert is None else [convert(row) for row in rows]
+        nbytes = text_size(rows)
+        try:
+            async with self.pool.acquire() as conn:
+                writer = await self._writer(conn, cls)
+                started = time.perf_counter()
+                async with conn.transaction():
+                    inserted, updated = await writer(conn, cls, records)
+        except asyncpg.PostgresError as er:
+            logging.error('PostgreSQL error: %s: %s', er.__class__.__name__, er)
+            raise
+        counts = {'inserted': inserted, 'updated': updated, 'unchanged': len(rows) - inserted - updated}
+        table_stats = self.stats.setdefault(cls.model, dict.fromkeys(counts, 0))
+        for name, count in counts.items():
+            table_stats[name] += count
+        if self.metrics is not None:
+            self.metrics.observe(cls.model, WRITE, time.perf_counter() - started, len(rows), nbytes)
+            self.metrics.count(cls.model, **counts)
+        return nbytes
+
+    async def _writer(self, conn: asyncpg.Connection, cls: dataclass):
+        """Способ записи выбирается, как у PostgresSaver, один раз на таблицу - до записи первой пачки."""
+        async with self._lock:
+            if cls.model not in self._writers:
+                if self.mode == INSERT_MODE:
+                    writer = self._insert
+                elif not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM content.{})".format(cls.model)):
+                    writer = self._copy
+                else:
+                    writer = self._staged_copy if self.mode == COPY_MODE or self.update else self._insert
+                self._writers[cls.model] = writer
+            return self._writers[cls.model]
+
+    async def _insert(self, conn: asyncpg.Connection, cls: dataclass, records):
+        fields_ = ', '.join(cls.__slots__)
+        arrays = ', '.join('${}::{}[]'.format(pos, PG_TYPES[item.type]) for pos, item in enumerate(fields(cls), 1))
+        row = await conn.fetchrow(counted(f"""
+        INSERT INTO content.{cls.model} AS target ({fields_})
+        SELECT * FROM unnest({arrays})
+        {on_conflict(cls, self.update)}
+        """), *(list(column) for column in zip(*records)))
+        return tuple(row)
+
+    async def _copy(self, conn: asyncpg.Connection, cls: dataclass, records):
+        await conn.copy_records_to_table(cls.model, schema_name='content', columns=cls.__slots__, records=records)
+        return len(records), 0
+
+    async def _staged_copy(self, conn: asyncpg.Connection, cls: dataclass, records):
+        staging = "staging_{}".format(cls.model)
+        fields_ = ', '.join(cls.__slots__)
+        await conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE content.{cls.model} INCLUDING DEFAULTS)")
+        await conn.execute(f"TRUNCATE {staging}")
+        await conn.copy_records_to_table(staging, columns=cls.__slots__, records=records)
+        row = await conn.fetchrow(counted(f"""
+        INSERT INTO content.{cls.model} AS target ({fields_})
+        SELECT {fields_} FROM {staging}
+        {on_conflict(cls, self.update)}
+        """))
+        return tuple(row)
+
+
+async def run_async_pipeline(batches, write, writers: int, reader: Executor, queue_size: int = 4):
+    """Асинхронный вариант run_pipeline: пачки читаются в потоке reader и записываются writers сопрограммами.
+
+    Очередь ограничена queue_size пачками. Ошибка любой записи останавливает чтение, остальные сопрограммы
+    дочитывают очередь вхолостую, после чего ошибка пробрасывается.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = asyncio.Queue(maxsize=queue_size)
+    errors = []
+
+    async def work():
+        while (batch := await tasks.get()) is not _DONE:
+            if errors:
+                continue
+            try:
+                await write(batch)
+            except Exception as er:
+                errors.append(er)
+
+    workers = [asyncio.ensure_future(work()) for _ in range(writers)]
+    iterator = iter(batches)
+    try:
+        while not errors:
+            batch = await loop.run_in_executor(reader, next, iterator, _DONE)
+            if batch is _DONE:
+                break
+            await tasks.put(batch)
+    except Exception as er:
+        errors.append(er)
+    finally:
+        for _ in workers:
+            await tasks.put(_DONE)
+        await asyncio.gather(*workers)
+    if errors:
+        raise errors[0]
+
+
+async def load_table_async(sqlite_loader, postgres_saver: AsyncPostgresSaver, state: LoadState, cls,
+                           sizer: BatchSizer, writers: int, reader: Executor, queue_size: int = 4,
+                           commit_every: int = COMMIT_EVERY):
+    """Перенос одной таблицы, как load_table, но пачки записываются одновременно и фиксируются каждая отдельно.
+
+    sqlite_loader используется только в однопоточном reader, в котором он был создан.
+
+    Пачки могут завершаться не по порядку, поэтому контрольная точка сдвигается только по непрерывному
+    префиксу записанных пачек: всё до неё уже зафиксировано, а перезапись после неё безопасна (ON CONFLICT).
+    """
+    pg_conn = state.pg_conn
+    table = state.get(cls)
+    if table.status == DONE:
+        logging.info('%s is already loaded', cls.model)
+        return
+    if table.last_id is not None:
+        logging.info('Resuming %s after id %s', cls.model, table.last_id)
+
+    id_pos = cls.__slots__.index('id')
+    watermark_pos = cls.__slots__.index(watermark_field(cls))
+    mark = table.pending_watermark
+    written, contiguous, checkpointed, last_id = {}, 0, 0, None
+    checkpoint_lock = asyncio.Lock()
+
+    def checkpoint(last_id_, mark_):
+        state.checkpoint(cls, last_id_, mark_)
+        pg_conn.commit()
+
+    async def write(item):
+        nonlocal mark, contiguous, checkpointed, last_id
+        seq, data = item
+        rows = as_rows(cls, data)
+        started = time.perf_counter()
+        nbytes = await postgres_saver.save_all_data(cls, rows)
+        sizer.observe(len(rows), nbytes, time.perf_counter() - started)
+        written[seq] = rows[-1][id_pos], max_watermark(rows, watermark_pos)
+        while contiguous in written:
+            last_id, batch_mark = written.pop(contiguous)
+            mark = max_watermark([(batch_mark,)], 0, mark)
+            contiguous += 1
+        if commit_every and contiguous - checkpointed >= commit_every:
+            async with checkpoint_lock:
+                if contiguous - checkpointed >= commit_every:
+                    checkpointed = contiguous
+                    await asyncio.to_thread(checkpoint, last_id, mark)
+
+    metrics = postgres_saver.metrics
+    if metrics is not None:
+        metrics.start(cls.model)
+    loop = asyncio.get_running_loop()
+    objs = sqlite_loader.load_objs(cls, FIELDS_MAPPING, sizer, table.watermark, table.last_id)
+    try:
+        await run_async_pipeline(enumerate(objs), write, writers, reader, queue_size)
+    finally:
+        await loop.run_in_executor(reader, objs.close)
+    if metrics is not None:
+        metrics.finish(cls.model)
+    if cls.model in postgres_saver.stats:
+        logging.info('%s: %s', cls.model, ', '.join(
+            '{} {}'.format(count, name) for name, count in postgres_saver.stats[cls.model].items()))
+    state.finish(cls, mark)
+    pg_conn.commit()
+
+
+async def load_async(sqlite_path: str, pg_conn: _connection, pg_params: dict, connections: int = 4,
+                     writer_mode: str = AUTO_MODE, queue_size: int = 4, full: bool = False,
+                     commit_every: int = COMMIT_EVERY, processes: int = 1, validate: bool = False,
+                     batching: dict = None, bulk: bool = False, unlogged: bool = False, metrics: Metrics = None):
+    """Аналог load_from_sqlite с асинхронной записью на пуле из connections соединений asyncpg.
+
+    Таблицы загружаются по очереди, пачки каждой таблицы - одновременно, не больше connections сразу.
+    pg_conn используется для выбора режима загрузки, контрольных точек и режима bulk.
+    База SQLite sqlite_path открывается в потоке чтения.
+    """
+    incremental = prepare(pg_conn, full)
+    rebuild = start_rebuild(pg_conn, CLASSES, bulk and not incremental, unlogged)
+    state = LoadState(pg_conn)
+    sizers = {cls.model: BatchSizer(**(batching or {})) for cls in CLASSES}
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-reader') as reader:
+        connection = await loop.run_in_executor(reader, sqlite3.connect, sqlite_path)
+        try:
+            sqlite_loader = await loop.run_in_executor(reader, get_loader, connection, processes, validate, metrics)
+            async with asyncpg.create_pool(
+                    min_size=connections, max_size=connections, **connect_params(pg_params)) as pool:
+                postgres_saver = AsyncPostgresSaver(pool, writer_mode, update=incremental, metrics=metrics)
+                for cls in CLASSES:
+                    await load_table_async(sqlite_loader, postgres_saver, state, cls, sizers[cls.model], connections,
+                                           reader, max(queue_size, connections), commit_every)
+        finally:
+            await loop.run_in_executor(reader, connection.close)
+    if rebuild is not None:
+        rebuild.finish()
+    report_batch_sizes(sizers)
@@ -0,0 +1,49 @@
+"""Подбор размера пачки по ходу загрузки."""
+import logging
+from dataclasses import dataclass, field
+from typing import Union
+
+
+@dataclass
+class BatchSizer:
+    """Размер пачки одной таблицы, подстраиваемый по времени записи и объёму пачки.
+
+    После каждой записанной пачки размер пересчитывается так, чтобы следующая пачка писалась не дольше
+    target_seconds и занимала не больше max_bytes, но растёт не больше чем вдвое за шаг и остаётся
+    в пределах [min_size, max_size]. Память загрузки ограничена примерно (queue_size + 2) * max_bytes.
+    С adaptive=False размер не меняется.
+    """
+    size: int = 500
+    min_size: int = 50
+    max_size: int = 50000
+    target_seconds: float = 0.5
+    max_bytes: int = 8 * 1024 * 1024
+    adaptive: bool = True
+    sizes: list = field(default_factory=list, repr=False)
+
+    def observe(self, rows: int, nbytes: int, seconds: float):
+        self.sizes.append(self.size)
+        if not self.adaptive or not rows:
+            return
+        limit = self.max_size
+        if seconds > 0:
+            limit = min(limit, self.target_seconds * rows / seconds)
+        if nbytes > 0:
+            limit = min(limit, self.max_bytes * rows / nbytes)
+        self.size = max(self.min_size, min(int(limit), self.size * 2))
+
+    def summary(self) -> str:
+        if not self.sizes:
+            return 'no batches, size {}'.format(self.size)
+        return 'final {}, min {}, max {}, {} batches'.format(self.size, min(self.sizes), max(self.sizes),
+                                                             len(self.sizes))
+
+
+def size_of(batch_size: Union[int, BatchSizer]) -> int:
+    """Текущий размер пачки: batch_size может быть числом или BatchSizer."""
+    return batch_size.size if isinstance(batch_size, BatchSizer) else batch_size
+
+
+def report_batch_sizes(sizers: dict):
+    for model, sizer in sizers.items():
+        logging.info('Batch size for %s: %s', model, sizer.summary())
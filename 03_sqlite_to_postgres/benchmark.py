@@ -0,0 +1,110 @@
+"""Замеры load_data.py на синтетических базах разного размера и в разных режимах.
+
+Каждая конфигурация запускается отдельным процессом load_data.py --full --report ..., поэтому пиковый RSS
+относится к одной загрузке. Загрузка очищает таблицы content, так что базу Postgres нужно указать явно
+(--dbname) и она должна быть отдельной от рабочей.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from generate_data import generate
+
+logging.basicConfig(level=logging.INFO)
+
+HERE = Path(__file__).resolve().parent
+
+
+def sqlite_for_scale(data_dir: Path, film_works: int) -> Path:
+    path = data_dir / 'bench_{}.sqlite'.format(film_works)
+    if not path.exists():
+        logging.info('Generating %s', path)
+        generate(str(path), film_works)
+    return path
+
+
+def run_config(sqlite_path: Path, dbname: str, config: dict) -> dict:
+    with tempfile.NamedTemporaryFile(suffix='.json') as report:
+        command = [
+            sys.executable, str(HERE / 'load_data.py'), '--full', '--sqlite', str(sqlite_path), '--report', report.name,
+            '--writer', config['writer'], '--batch-size', str(config['batch_size']),
+            '--workers', str(config['workers']), '--processes', str(config['processes']),
+            '--engine', config['engine'], '--queue-size', str(config['queue_size']),
+        ]
+        if config['connections'] is not None:
+            command += ['--connections', str(config['connections'])]
+        if not config['adaptive']:
+            command.append('--no-adaptive')
+        subprocess.run(command, cwd=HERE, check=True, env={**os.environ, 'DB_NAME': dbname, 'LOG_LEVEL': 'WARNING'})
+        return json.load(report)
+
+
+def configs(args, adaptive: list):
+    """Сочетания параметров; --connections относится только к --engine async, а --workers - только к sync."""
+    seen = []
+    for engine, writer, batch_size, is_adaptive, workers, processes, queue_size, connections in itertools.product(
+            args.engines, args.writers, args.batch_sizes, adaptive, args.workers, args.processes, args.queue_sizes,
+            args.connections):
+        config = {'engine': engine, 'writer': writer, 'batch_size': batch_size, 'adaptive': is_adaptive,
+                  'workers': workers if engine == 'sync' else 1, 'processes': processes, 'queue_size': queue_size,
+                  'connections': connections if engine == 'async' else None}
+        if config not in seen:
+            seen.append(config)
+            yield config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dbname', required=True, help='база Postgres для замеров (таблицы content очищаются)')
+    parser.add_argument('--data-dir', default=str(HERE / 'bench_data'), help='где хранить сгенерированные базы')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000],
+                        help='число кинопроизведений в сгенерированных базах')
+    parser.add_argument('--writers', nargs='+', default=['copy', 'insert'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 5000])
+    parser.add_argument('--adaptive', choices=('on', 'off', 'both'), default='both')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1])
+    parser.add_argument('--engines', nargs='+', choices=('sync', 'async'), default=['sync', 'async'])
+    parser.add_argument('--connections', type=int, nargs='+', default=[4],
+                        help='соединений asyncpg для --engine async')
+    parser.add_argument('--queue-sizes', type=int, nargs='+', default=[4])
+    parser.add_argument('--output', help='куда записать результаты в JSON')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    adaptive = {'on': [True], 'off': [False], 'both': [True, False]}[args.adaptive]
+    results = []
+    for scale in args.scales:
+        sqlite_path = sqlite_for_scale(data_dir, scale)
+        for config in configs(args, adaptive):
+            config = {'scale': scale, **config}
+            logging.info('Running %s', config)
+            report = run_config(sqlite_path, args.dbname, config)
+            results.append({'config': config, 'report': report})
+
+    header = '{:>10}{:>8}{:>8}{:>8}{:>10}{:>9}{:>11}{:>7}{:>7}{:>10}{:>12}{:>10}'.format(
+        'films', 'engine', 'writer', 'batch', 'adaptive', 'workers', 'processes', 'queue', 'conns',
+        'seconds', 'rows/s', 'RSS MB')
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        config, report = result['config'], result['report']
+        print('{:>10}{:>8}{:>8}{:>8}{:>10}{:>9}{:>11}{:>7}{:>7}{:>10.1f}{:>12.0f}{:>10.0f}'.format(
+            config['scale'], config['engine'], config['writer'], config['batch_size'],
+            'on' if config['adaptive'] else 'off', config['workers'], config['processes'], config['queue_size'],
+            config['connections'] or '-', report['seconds'], report['rows_per_second'],
+            report['peak_rss_mb']['self'] + report['peak_rss_mb']['children']))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
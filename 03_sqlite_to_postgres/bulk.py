@@ -0,0 +1,171 @@
+"""Полная перезагрузка без поддержки вторичных индексов во время загрузки."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+
+from psycopg2.extensions import connection as _connection
+from psycopg2.pool import ThreadedConnectionPool
+
+from contexts import pooled_conn_context
+from scheduler import dependency_graph
+
+INDEXES_TABLE = 'content.load_indexes'
+
+
+@dataclass(frozen=True)
+class IndexDefinition:
+    table_name: str
+    name: str
+    definition: str
+    is_constraint: bool
+
+    def drop_sql(self) -> str:
+        if self.is_constraint:
+            return 'ALTER TABLE content.{} DROP CONSTRAINT {}'.format(self.table_name, self.name)
+        return 'DROP INDEX content.{}'.format(self.name)
+
+    def create_sql(self) -> str:
+        if self.is_constraint:
+            return 'ALTER TABLE content.{} ADD CONSTRAINT {} {}'.format(self.table_name, self.name, self.definition)
+        return self.definition
+
+
+def start_rebuild(pg_conn: _connection, classes, bulk: bool, unlogged: bool = False):
+    """Начинает режим BulkRebuild, если он запрошен или не завершён прерванной загрузкой; иначе возвращает None."""
+    rebuild = BulkRebuild(pg_conn, classes, unlogged)
+    if not bulk and not rebuild.definitions():
+        return None
+    rebuild.begin()
+    return rebuild
+
+
+def capture_indexes(pg_conn: _connection, classes) -> list:
+    """Вторичные индексы таблиц и ограничения уникальности, на которых они держатся; первичные ключи не трогаются."""
+    with pg_conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT t.relname, coalesce(con.conname, i.relname),
+               coalesce(pg_get_constraintdef(con.oid), pg_get_indexdef(i.oid)), con.oid IS NOT NULL
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        LEFT JOIN pg_constraint con ON con.conindid = i.oid AND con.conrelid = t.oid AND con.contype IN ('u', 'x')
+        WHERE n.nspname = 'content' AND t.relname = ANY(%s) AND NOT x.indisprimary
+        ORDER BY 1, 2
+        """, ([cls.model for cls in classes],))
+        return [IndexDefinition(*row) for row in cursor.fetchall()]
+
+
+@dataclass
+class BulkRebuild:
+    """Режим полной перезагрузки: перед загрузкой вторичные индексы удаляются, после - создаются заново.
+
+    Определения индексов сохраняются в INDEXES_TABLE в одной транзакции с их удалением, поэтому
+    прерванная загрузка при продолжении восстановит те же индексы. С unlogged=True пустые таблицы на время
+    загрузки становятся UNLOGGED (после сбоя сервера их содержимое теряется - загрузку нужно повторить с --full).
+    Выигрыш от UNLOGGED невелик: если wal_level не minimal, SET LOGGED в конце записывает каждую таблицу
+    в WAL целиком, так что запись данных в WAL не экономится, а откладывается. Непустые таблицы
+    в UNLOGGED не переводятся: их пришлось бы переписать дважды.
+    """
+    pg_conn: _connection
+    classes: tuple
+    unlogged: bool = False
+
+    def definitions(self) -> list:
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {INDEXES_TABLE} (
+                table_name text NOT NULL,
+                name text PRIMARY KEY,
+                definition text NOT NULL,
+                is_constraint boolean NOT NULL
+            )
+            """)
+            cursor.execute(f"SELECT table_name, name, definition, is_constraint FROM {INDEXES_TABLE} ORDER BY 1, 2")
+            return [IndexDefinition(*row) for row in cursor.fetchall()]
+
+    def begin(self):
+        saved = self.definitions()
+        with self.pg_conn.cursor() as cursor:
+            if saved:
+                logging.info('Indexes are already dropped by an interrupted bulk load: %s', [d.name for d in saved])
+            else:
+                for definition in capture_indexes(self.pg_conn, self.classes):
+                    cursor.execute(f"INSERT INTO {INDEXES_TABLE} VALUES (%s, %s, %s, %s)", (
+                        definition.table_name, definition.name, definition.definition, definition.is_constraint))
+                    cursor.execute(definition.drop_sql())
+                    logging.info('Dropped %s', definition.name)
+            if self.unlogged:
+                cursor.execute('SHOW wal_level')
+                if cursor.fetchone()[0] != 'minimal':
+                    logging.warning('wal_level is not minimal: SET LOGGED will write every table to WAL again')
+                # таблицы связей раньше таблиц, на которые они ссылаются
+                for cls in reversed(self.order()):
+                    cursor.execute('SELECT EXISTS (SELECT 1 FROM content.{})'.format(cls.model))
+                    if cursor.fetchone()[0]:
+                        logging.info('%s is not empty, it stays logged', cls.model)
+                        continue
+                    cursor.execute('ALTER TABLE content.{} SET UNLOGGED'.format(cls.model))
+        self.pg_conn.commit()
+
+    def finish(self, pool: ThreadedConnectionPool = None, workers: int = 1):
+        """Возвращает таблицам журналирование, создаёт индексы (параллельно, если передан пул) и сверяет их."""
+        saved = self.definitions()
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT relname FROM pg_class
+            WHERE relnamespace = 'content'::regnamespace AND relname = ANY(%s) AND relpersistence = 'u'
+            """, ([cls.model for cls in self.classes],))
+            unlogged = {row[0] for row in cursor.fetchall()}
+            for cls in self.order():
+                if cls.model in unlogged:
+                    cursor.execute('ALTER TABLE content.{} SET LOGGED'.format(cls.model))
+            self.pg_conn.commit()
+
+            if pool is not None and workers > 1:
+                def create(definition: IndexDefinition):
+                    with pooled_conn_context(pool) as conn, conn.cursor() as pool_cursor:
+                        pool_cursor.execute(definition.create_sql())
+
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(create, saved))
+            else:
+                for definition in saved:
+                    cursor.execute(definition.create_sql())
+            self.verify(saved)
+            cursor.execute(f"DELETE FROM {INDEXES_TABLE}")
+        self.pg_conn.commit()
+
+    def verify(self, saved: list):
+        """Сверяет восстановленные индексы и ограничения с сохранёнными определениями.
+
+        Кроме совпадения определений проверяется, что индексы готовы к использованию (indisvalid, indisready),
+        а ограничения существуют как ограничения и проверены (convalidated).
+        """
+        current = set(capture_indexes(self.pg_conn, self.classes))
+        broken = {d.name for d in set(saved) - current}
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT i.relname FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE i.relnamespace = 'content'::regnamespace AND i.relname = ANY(%s)
+              AND x.indisvalid AND x.indisready
+            """, ([d.name for d in saved if not d.is_constraint],))
+            valid = {row[0] for row in cursor.fetchall()}
+            cursor.execute("""
+            SELECT con.conname FROM pg_constraint con
+            JOIN pg_index x ON x.indexrelid = con.conindid
+            WHERE con.connamespace = 'content'::regnamespace AND con.conname = ANY(%s)
+              AND con.convalidated AND x.indisvalid AND x.indisready
+            """, ([d.name for d in saved if d.is_constraint],))
+            valid |= {row[0] for row in cursor.fetchall()}
+        broken |= {d.name for d in saved} - valid
+        if broken:
+            logging.error('Indexes or constraints are missing, invalid or differ from their original definitions: %s',
+                          sorted(broken))
+            raise RuntimeError('Index rebuild verification failed')
+        logging.info('Recreated %s indexes and constraints', len(saved))
+
+    def order(self) -> list:
+        return list(TopologicalSorter(dependency_graph(self.classes)).static_order())
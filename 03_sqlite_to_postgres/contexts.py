@@ -1,7 +1,7 @@
-import logging
 from contextlib import contextmanager
 import sqlite3
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 
 
 @contextmanager
@@ -19,8 +19,31 @@ def pg_conn_context(**kwargs):
     try:
         yield conn
         conn.commit()
-    except psycopg2.Error as er:
-        logging.error('psycopg2.Error: %s' % (' '.join(er.args)))
+    except psycopg2.Error:
         conn.rollback()
+        raise
     finally:
         conn.close()
+
+
+@contextmanager
+def pg_pool_context(maxconn: int, **kwargs):
+    pool = ThreadedConnectionPool(1, maxconn, **kwargs)
+    try:
+        yield pool
+    finally:
+        pool.closeall()
+
+
+@contextmanager
+def pooled_conn_context(pool: ThreadedConnectionPool):
+    """Соединение из пула; любая ошибка откатывает транзакцию и пробрасывается дальше."""
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
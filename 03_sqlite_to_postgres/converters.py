@@ -0,0 +1,83 @@
+"""Преобразование строк SQLite в значения для записи в Postgres без промежуточных объектов.
+
+SQLite хранит uuid, даты и время как текст. Реестр REGISTRY по аннотации поля датакласса даёт
+преобразования:
+- PYTHON - в значение аннотированного типа (uuid.UUID, datetime.date, datetime.datetime, float);
+- TEXT - в текст, который без изменений принимают COPY и INSERT: uuid, дата и время передаются как есть
+  и разбираются только сервером; с validate они дополнительно проверяются разбором в Python.
+Разбор кэшируется только для столбцов CACHED_FIELDS: в таблицах связей одни и те же film_work_id, genre_id
+и person_id повторяются много раз, а id, created и modified уникальны и кэш бы только вытесняли.
+"""
+import datetime
+import uuid
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Callable, Optional
+
+PYTHON = 'python'
+TEXT = 'text'
+
+CACHE_SIZE = 1 << 16
+CACHED_FIELDS = frozenset(('film_work_id', 'genre_id', 'person_id'))
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        # смещение вида +00 до Python 3.11 не разбирается
+        return datetime.datetime.fromisoformat(value + ':00')
+
+
+def checked(parse: Callable) -> Callable:
+    """Текстовое преобразование, которое только проверяет значение разбором."""
+    def convert(value: str) -> str:
+        parse(value)
+        return value
+    return convert
+
+
+@dataclass(frozen=True)
+class Converter:
+    to_python: Callable
+    to_text: Optional[Callable] = None
+    check: Optional[Callable] = None
+
+
+REGISTRY = {
+    uuid.UUID: Converter(uuid.UUID, check=checked(uuid.UUID)),
+    datetime.date: Converter(datetime.date.fromisoformat, check=checked(datetime.date.fromisoformat)),
+    datetime.datetime: Converter(parse_timestamp, check=checked(parse_timestamp)),
+    float: Converter(float, float),
+}
+
+
+def select(converter: Converter, target: str, validate: bool) -> Optional[Callable]:
+    if target == PYTHON:
+        return converter.to_python
+    if validate and converter.check is not None:
+        return converter.check
+    return converter.to_text
+
+
+@lru_cache(maxsize=None)
+def compile_converter(cls: dataclass, target: str = TEXT, validate: bool = False):
+    """Функция row -> tuple для строк в порядке cls.__slots__, собранная один раз по аннотациям датакласса.
+
+    Преобразуются только столбцы, для типа которых в REGISTRY есть преобразование; None остаётся None.
+    Если преобразовывать нечего, возвращает None - строки SQLite можно писать как есть.
+    """
+    namespace, items = {}, []
+    for pos, item in enumerate(fields(cls)):
+        converter = REGISTRY.get(item.type)
+        convert = converter and select(converter, target, validate)
+        if convert is None:
+            items.append('row[{}]'.format(pos))
+        else:
+            if item.name in CACHED_FIELDS:
+                convert = lru_cache(maxsize=CACHE_SIZE)(convert)
+            namespace['c{}'.format(pos)] = convert
+            items.append('(None if row[{0}] is None else c{0}(row[{0}]))'.format(pos))
+    if not namespace:
+        return None
+    return eval('lambda row: ({},)'.format(', '.join(items)), namespace)
@@ -0,0 +1,158 @@
+"""Генерация синтетической базы SQLite со схемой models.py для замеров загрузки."""
+import argparse
+import datetime
+import random
+import sqlite3
+import uuid
+
+SCHEMA = """
+CREATE TABLE film_work (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    creation_date DATE,
+    rating FLOAT,
+    type TEXT NOT NULL,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE genre (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE person (
+    id TEXT PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE genre_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    genre_id TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE TABLE person_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+"""
+
+GENRES = ('Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+          'Fantasy', 'History', 'Horror', 'Music', 'Musical', 'Mystery', 'News', 'Reality-TV', 'Romance', 'Sci-Fi',
+          'Short', 'Sport', 'Talk-Show', 'Thriller', 'War', 'Western', 'Game-Show')
+ROLES = ('actor', 'actor', 'actor', 'actor', 'writer', 'director', 'producer')
+WORDS = ('star', 'galaxy', 'war', 'empire', 'return', 'hope', 'night', 'city', 'dark', 'light', 'secret', 'lost',
+         'world', 'journey', 'last', 'first', 'hero', 'shadow', 'storm', 'river', 'king', 'queen', 'dream', 'fire')
+FIRST_NAMES = ('Anna', 'Boris', 'Clara', 'Denis', 'Elena', 'Fedor', 'Galina', 'Igor', 'John', 'Kate', 'Leo', 'Maria',
+               'Nikita', 'Olga', 'Paul', 'Rita', 'Sergey', 'Tina', 'Victor', 'Yana')
+LAST_NAMES = ('Smith', 'Ivanov', 'Brown', 'Petrova', 'Lee', 'Garcia', 'Sokolov', 'Miller', 'Kuznetsova', 'Wilson',
+              'Novak', 'Martin', 'Popov', 'Clark', 'Lewis', 'Volkova', 'Walker', 'Hall', 'Orlov', 'Young')
+
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+CHUNK = 10000
+TEXT_POOL = 1024
+
+
+class Generator:
+    """Детерминированные (при одном seed) значения для строк всех таблиц."""
+
+    def __init__(self, seed: int, max_description: int = 4000):
+        self.random = random.Random(seed)
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_OID, 'generate_data:{}'.format(seed))
+        # описания режутся из заранее набранных текстов: генерировать каждое по словам слишком долго
+        self.texts = [self.text(max(20, max_description // 5)) for _ in range(TEXT_POOL)]
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def indexed_uuid(self, index: int) -> str:
+        """uuid записи по её номеру: на больших базах идентификаторы персон не хранятся, а вычисляются."""
+        return str(uuid.uuid5(self.namespace, str(index)))
+
+    def timestamp(self) -> str:
+        moment = START + datetime.timedelta(seconds=self.random.randrange(3 * 365 * 24 * 3600),
+                                            microseconds=self.random.randrange(1000000))
+        return moment.strftime('%Y-%m-%d %H:%M:%S.%f+00')
+
+    def text(self, words: int) -> str:
+        return ' '.join(self.random.choices(WORDS, k=words))
+
+    def description(self, max_length: int):
+        if self.random.random() < 0.1:
+            return None
+        text = self.texts[self.random.randrange(TEXT_POOL)]
+        return text[:self.random.randint(min(100, max_length), max_length)]
+
+
+def generate(path: str, film_works: int, persons_per_film: int = 6, max_description: int = 4000, seed: int = 0):
+    """Создаёт базу path: film_works кинопроизведений, у каждого 1-3 жанра и в среднем persons_per_film персон.
+
+    Персон примерно в persons_per_film / 3 раз меньше, чем ссылок на них, так что одни и те же
+    персоны встречаются во многих фильмах, как в настоящем каталоге.
+    """
+    generator = Generator(seed, max_description)
+    rand = generator.random
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.executescript(SCHEMA)
+
+        genre_ids = []
+        for name in GENRES:
+            genre_ids.append(generator.uuid())
+            created = generator.timestamp()
+            conn.execute('INSERT INTO genre VALUES (?, ?, ?, ?, ?)',
+                         (genre_ids[-1], name, generator.description(500), created, created))
+
+        person_count = max(1, film_works * persons_per_film // 3)
+        for start in range(0, person_count, CHUNK):
+            rows = []
+            for index in range(start, min(start + CHUNK, person_count)):
+                created = generator.timestamp()
+                full_name = '{} {}'.format(rand.choice(FIRST_NAMES), rand.choice(LAST_NAMES))
+                rows.append((generator.indexed_uuid(index), full_name, created, created))
+            conn.executemany('INSERT INTO person VALUES (?, ?, ?, ?)', rows)
+
+        for start in range(0, film_works, CHUNK):
+            films, genres, persons = [], [], []
+            for _ in range(min(CHUNK, film_works - start)):
+                film_id = generator.uuid()
+                created = generator.timestamp()
+                films.append((
+                    film_id, generator.text(rand.randint(1, 5)).title(), generator.description(max_description),
+                    (START - datetime.timedelta(days=rand.randrange(36500))).date().isoformat(),
+                    round(rand.uniform(0, 100), 1) if rand.random() > 0.05 else None,
+                    'movie' if rand.random() < 0.8 else 'tv_show', created, created,
+                ))
+                for genre_id in rand.sample(genre_ids, rand.randint(1, 3)):
+                    genres.append((generator.uuid(), film_id, genre_id, created))
+                # номера, а не сами uuid: список всех персон занимал бы гигабайты на 10 млн фильмов
+                cast = rand.sample(range(person_count), min(person_count, rand.randint(1, 2 * persons_per_film - 1)))
+                for index in cast:
+                    persons.append((generator.uuid(), film_id, generator.indexed_uuid(index), rand.choice(ROLES),
+                                    created))
+            conn.executemany('INSERT INTO film_work VALUES (?, ?, ?, ?, ?, ?, ?, ?)', films)
+            conn.executemany('INSERT INTO genre_film_work VALUES (?, ?, ?, ?)', genres)
+            conn.executemany('INSERT INTO person_film_work VALUES (?, ?, ?, ?, ?)', persons)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help='куда записать базу SQLite (файл не должен существовать)')
+    parser.add_argument('--film-works', type=int, default=10000)
+    parser.add_argument('--persons-per-film', type=int, default=6)
+    parser.add_argument('--max-description', type=int, default=4000, help='наибольшая длина описания')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.film_works, args.persons_per_film, args.max_description, args.seed)
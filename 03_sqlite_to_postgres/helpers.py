@@ -1,11 +1,27 @@
+import io
 import sqlite3
 import sys
+import time
 import traceback
 from copy import deepcopy
-from dataclasses import dataclass, astuple
+from dataclasses import dataclass, field
 import logging
+from operator import attrgetter
+from typing import Union
+
 import psycopg2
-from psycopg2.extensions import connection as _connection
+from psycopg2.extensions import connection as _connection, encodings
+
+from batching import BatchSizer, size_of
+from converters import compile_converter
+from metrics import Metrics, READ, CONVERT, WRITE
+
+AUTO_MODE = 'auto'
+COPY_MODE = 'copy'
+INSERT_MODE = 'insert'
+WRITER_MODES = (AUTO_MODE, COPY_MODE, INSERT_MODE)
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
 
 
 def get_fields(fields, fields_mapping: dict = None):
@@ -17,57 +33,234 @@ def get_fields(fields, fields_mapping: dict = None):
     return ', '.join(ret)
 
 
+def watermark_field(cls: dataclass) -> str:
+    """Поле, по которому отбираются изменившиеся записи при инкрементальной загрузке."""
+    return 'modified' if 'modified' in cls.__slots__ else 'created'
+
+
+def select_conditions(instance: dataclass, fields_mapping: dict = None, since: str = None):
+    """Условия отбора записей SQLite для инкрементальной загрузки и их параметры."""
+    if since is None:
+        return [], []
+    column = watermark_field(instance)
+    return ['{} >= ?'.format((fields_mapping or {}).get(column, column))], [since]
+
+
+def where_clause(conditions) -> str:
+    return ' WHERE {}'.format(' AND '.join(conditions)) if conditions else ''
+
+
+def as_rows(cls: dataclass, data) -> list:
+    """Пачка в виде кортежей значений в порядке cls.__slots__; пачки датаклассов разбираются без deepcopy."""
+    if data and not isinstance(data[0], tuple):
+        getter = attrgetter(*cls.__slots__)
+        return [getter(item) for item in data]
+    return data
+
+
+def max_watermark(rows, pos: int, current: str = None):
+    values = [value for row in rows if (value := row[pos]) is not None]
+    if not values:
+        return current
+    return max(values) if current is None else max(current, max(values))
+
+
+def on_conflict(cls: dataclass, update: bool = False) -> str:
+    """ON CONFLICT для INSERT INTO ... AS target.
+
+    При update запись обновляется, только если в источнике она новее (по modified),
+    а у таблиц без modified - если отличается хотя бы одно поле.
+    """
+    if not update:
+        return 'ON CONFLICT (id) DO NOTHING'
+    columns = [name for name in cls.__slots__ if name != 'id']
+    if 'modified' in columns:
+        changed = 'target.modified IS NULL OR EXCLUDED.modified > target.modified'
+    else:
+        changed = '({}) IS DISTINCT FROM ({})'.format(', '.join('target.{}'.format(name) for name in columns),
+                                                      ', '.join('EXCLUDED.{}'.format(name) for name in columns))
+    return 'ON CONFLICT (id) DO UPDATE SET {} WHERE {}'.format(
+        ', '.join('{0} = EXCLUDED.{0}'.format(name) for name in columns), changed)
+
+
+def counted(insert: str) -> str:
+    """Оборачивает INSERT ... ON CONFLICT так, чтобы он вернул число вставленных и обновлённых строк."""
+    return f"""
+    WITH applied AS ({insert} RETURNING (xmax = 0) AS inserted)
+    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM applied
+    """
+
+
+def copy_value(value) -> str:
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_buffer(rows, encoding: str = 'utf-8') -> io.BytesIO:
+    """Пачка строк в виде файла для COPY ... FROM STDIN, уже закодированная в кодировке соединения."""
+    buffer = io.BytesIO()
+    for row in rows:
+        buffer.write('\t'.join(map(copy_value, row)).encode(encoding))
+        buffer.write(b'\n')
+    buffer.seek(0)
+    return buffer
+
+
+def client_encoding(cursor) -> str:
+    """Кодировка Python, соответствующая client_encoding соединения курсора."""
+    return encodings[cursor.connection.encoding]
+
+
 @dataclass
 class SQLiteLoader:
+    """Чтение таблиц SQLite пачками.
+
+    По умолчанию пачка - список кортежей в порядке instance.__slots__, прошедших через
+    compile_converter(instance). С validate=True uuid, даты и время проверяются разбором, а строки собираются
+    в датаклассы (для проверки и отладки).
+    Если задан metrics, в него записывается время чтения и преобразования каждой пачки.
+    """
     connection: sqlite3.Connection
+    validate: bool = False
+    metrics: Metrics = None
 
-    def load_objs(self, instance: dataclass, fields_mapping: dict = None, batch_size: int = 500):
-        self.connection.row_factory = sqlite3.Row
+    def load_objs(self, instance: dataclass, fields_mapping: dict = None, batch_size: Union[int, BatchSizer] = 500,
+                  since: str = None, after: str = None):
+        """Читает таблицу пачками в порядке id.
+
+        batch_size - размер пачки или BatchSizer, размер из которого берётся перед чтением каждой пачки.
+        since - только записи с водяным знаком не меньше since, after - только записи с id больше after.
+        """
         cur = self.connection.cursor()
+        convert = compile_converter(instance, validate=self.validate)
+        conditions, args = select_conditions(instance, fields_mapping, since)
+        if after is not None:
+            conditions.append('id > ?')
+            args.append(after)
         params = {
             'fields': get_fields(instance.__slots__, fields_mapping),
             'table_name': instance.model,
+            'where': where_clause(conditions),
         }
         try:
-            cur.execute("SELECT {fields} FROM {table_name}".format(**params))
+            cur.execute("SELECT {fields} FROM {table_name}{where} ORDER BY id".format(**params), args)
 
-            while records := cur.fetchmany(batch_size):
-                yield [instance(**record) for record in records]
+            while True:
+                started = time.perf_counter()
+                records = cur.fetchmany(size_of(batch_size))
+                read = time.perf_counter()
+                if not records:
+                    break
+                if convert is not None:
+                    records = [convert(record) for record in records]
+                if self.validate:
+                    records = [instance(*record) for record in records]
+                if self.metrics is not None:
+                    self.metrics.observe(instance.model, READ, read - started)
+                    self.metrics.observe(instance.model, CONVERT, time.perf_counter() - read)
+                yield records
         except sqlite3.Error as er:
             logging.error('SQLite error: %s' % (' '.join(er.args)))
             logging.error("Exception class is: ", er.__class__)
             logging.error('SQLite traceback: ')
             exc_type, exc_value, exc_tb = sys.exc_info()
             logging.error(traceback.format_exception(exc_type, exc_value, exc_tb))
+            raise
         finally:
             cur.close()
 
 
 @dataclass
 class PostgresSaver:
+    """Запись пачек в PostgreSQL.
+
+    Режим записи (mode):
+    - auto: COPY в пустую таблицу, в непустую - INSERT ... ON CONFLICT, а при update - как copy;
+    - copy: COPY в пустую таблицу, в непустую - COPY во временную таблицу и перенос одним INSERT ... ON CONFLICT;
+    - insert: всегда INSERT ... VALUES ... ON CONFLICT.
+    Способ выбирается один раз на таблицу при первой пачке.
+    При update=True конфликтующие по id записи обновляются, если в источнике они новее (см. on_conflict),
+    иначе пропускаются. Число вставленных, обновлённых и оставшихся без изменений строк копится в stats.
+    Если задан metrics, в него записываются время, число строк и объём каждой пачки и те же счётчики.
+    """
     pg_conn: _connection
+    mode: str = AUTO_MODE
+    update: bool = False
+    metrics: Metrics = None
+    stats: dict = field(default_factory=dict, init=False)
+    _writers: dict = field(default_factory=dict, init=False, repr=False)
 
-    def save_all_data(self, cls: dataclass, data):
-        table = "content.{}".format(cls.model)
+    def save_all_data(self, cls: dataclass, data) -> int:
+        """Записывает пачку кортежей в порядке cls.__slots__ или датаклассов cls; возвращает объём пачки в байтах."""
         cursor = self.pg_conn.cursor()
-
-        fields = ', '.join(cls.__slots__)
-        args = ', '.join(cursor.mogrify('(%s)' % ', '.join('%s' for _ in cls.__slots__),
-                                        astuple(item)).decode() for item in data)
-        query = f"""
-        INSERT INTO {table} ({fields})
-        VALUES {args}
-        ON CONFLICT (id) DO NOTHING
-        """
-
         try:
-            cursor.execute(query)
+            writer = self._writers.get(cls.model)
+            if writer is None:
+                writer = self._writers[cls.model] = self._choose_writer(cursor, cls)
+            rows = as_rows(cls, data)
+            started = time.perf_counter()
+            nbytes, inserted, updated = writer(cursor, cls, rows)
+            counts = {'inserted': inserted, 'updated': updated, 'unchanged': len(rows) - inserted - updated}
+            table_stats = self.stats.setdefault(cls.model, dict.fromkeys(counts, 0))
+            for name, count in counts.items():
+                table_stats[name] += count
+            if self.metrics is not None:
+                self.metrics.observe(cls.model, WRITE, time.perf_counter() - started, len(rows), nbytes)
+                self.metrics.count(cls.model, **counts)
+            return nbytes
         except psycopg2.Error as er:
             logging.error('PostgreSQL error: %s' % (' '.join(er.args)))
             logging.error("Exception class is: ", er.__class__)
             logging.error('PostgreSQL traceback: ')
             exc_type, exc_value, exc_tb = sys.exc_info()
             logging.error(traceback.format_exception(exc_type, exc_value, exc_tb))
+            raise
         finally:
             cursor.close()
 
+    def _choose_writer(self, cursor, cls: dataclass):
+        if self.mode == INSERT_MODE:
+            return self._insert
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM content.{})".format(cls.model))
+        if not cursor.fetchone()[0]:
+            return self._copy
+        return self._staged_copy if self.mode == COPY_MODE or self.update else self._insert
+
+    def _insert(self, cursor, cls: dataclass, rows):
+        table = "content.{}".format(cls.model)
+        fields = ', '.join(cls.__slots__)
+        template = '(%s)' % ', '.join('%s' for _ in cls.__slots__)
+        args = ', '.join(cursor.mogrify(template, row).decode() for row in rows)
+        query = counted(f"""
+        INSERT INTO {table} AS target ({fields})
+        VALUES {args}
+        {on_conflict(cls, self.update)}
+        """)
+        cursor.execute(query)
+        return (len(query.encode(client_encoding(cursor))), *cursor.fetchone())
+
+    @staticmethod
+    def _stream(cursor, cls: dataclass, rows, table: str) -> int:
+        fields = ', '.join(cls.__slots__)
+        buffer = copy_buffer(rows, client_encoding(cursor))
+        cursor.copy_expert(f"COPY {table} ({fields}) FROM STDIN", buffer)
+        return buffer.getbuffer().nbytes
+
+    def _copy(self, cursor, cls: dataclass, rows):
+        return self._stream(cursor, cls, rows, "content.{}".format(cls.model)), len(rows), 0
+
+    def _staged_copy(self, cursor, cls: dataclass, rows):
+        table = "content.{}".format(cls.model)
+        staging = "staging_{}".format(cls.model)
+        fields = ', '.join(cls.__slots__)
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS)")
+        cursor.execute(f"TRUNCATE {staging}")
+        nbytes = self._stream(cursor, cls, rows, staging)
+        cursor.execute(counted(f"""
+        INSERT INTO {table} AS target ({fields})
+        SELECT {fields} FROM {staging}
+        {on_conflict(cls, self.update)}
+        """))
+        return (nbytes, *cursor.fetchone())
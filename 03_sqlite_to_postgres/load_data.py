@@ -1,37 +1,181 @@
 """Модуль загрузки данных из sqlite в PostgreSQL."""
+import argparse
+import asyncio
 import os
 import sqlite3
+import sys
+import time
 
 import psycopg2
 from dotenv import load_dotenv
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
 
-from contexts import sqlite_conn_context, pg_conn_context
-from helpers import SQLiteLoader, PostgresSaver
+from batching import BatchSizer, report_batch_sizes
+from bulk import BulkRebuild, start_rebuild
+from contexts import sqlite_conn_context, pg_conn_context, pg_pool_context, pooled_conn_context
+from metrics import Metrics
+from helpers import SQLiteLoader, PostgresSaver, AUTO_MODE, WRITER_MODES, as_rows, watermark_field, max_watermark
+from pipeline import run_pipeline
+from sharding import ShardedSQLiteLoader
+from scheduler import run_in_order
+from state import LoadState, DONE
 from models import Movie, Genre, Person, PersonFilmWork, GenreFilmWork
 import logging
 
 load_dotenv(dotenv_path='../02_movies_admin/.env')
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
 
+CLASSES = (Movie, Genre, Person, GenreFilmWork, PersonFilmWork)
+FIELDS_MAPPING = {'created': 'created_at', 'modified': 'updated_at'}
+COMMIT_EVERY = 20
+SYNC_ENGINE = 'sync'
+ASYNC_ENGINE = 'async'
 
-def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection):
-    """Основной метод загрузки данных из SQLite в Postgres."""
-    postgres_saver = PostgresSaver(pg_conn)
-    sqlite_loader = SQLiteLoader(connection)
-    batch_size = 500
-    classes = (Movie, Genre, Person, GenreFilmWork, PersonFilmWork)
-    for cls in classes:
-        with pg_conn.cursor() as cursor:
-            cursor.execute("TRUNCATE content.{} CASCADE".format(cls.model))
-        objs = sqlite_loader.load_objs(cls, {'created': 'created_at', 'modified': 'updated_at'}, batch_size)
-        for data in objs:
-            postgres_saver.save_all_data(cls, data)
 
+def truncate(pg_conn: _connection, classes=CLASSES):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("TRUNCATE {} CASCADE".format(', '.join('content.{}'.format(cls.model) for cls in classes)))
 
-if __name__ == '__main__':
-    params = {
+
+def get_loader(connection: sqlite3.Connection, processes: int = 1, validate: bool = False, metrics: Metrics = None):
+    """SQLiteLoader или, если processes > 1, ShardedSQLiteLoader для той же базы."""
+    if processes > 1:
+        db_path = connection.execute('PRAGMA database_list').fetchone()[2]
+        return ShardedSQLiteLoader(db_path, processes, validate, metrics)
+    return SQLiteLoader(connection, validate, metrics)
+
+
+def prepare(pg_conn: _connection, full: bool = False) -> bool:
+    """Выбирает режим загрузки и фиксирует его; возвращает True для инкрементальной загрузки.
+
+    Незавершённая загрузка продолжается с контрольных точек. Иначе, если для всех таблиц сохранены
+    водяные знаки, начинается инкрементальная загрузка. Иначе, а также при full, таблицы очищаются
+    и начинается полная. Удаления записей в SQLite инкрементальная загрузка не переносит.
+    """
+    state = LoadState(pg_conn)
+    state.ensure()
+    tables = {} if full else state.load()
+    if tables and all(cls.model in tables for cls in CLASSES):
+        incremental = any(table.incremental for table in tables.values())
+        if any(table.status != DONE for table in tables.values()):
+            logging.info('Resuming interrupted %s load', 'incremental' if incremental else 'full')
+            return incremental
+        logging.info('Incremental load, watermarks: %s', {name: table.watermark for name, table in tables.items()})
+        state.begin_incremental()
+        pg_conn.commit()
+        return True
+    logging.info('Full reload')
+    truncate(pg_conn)
+    state.begin_full(CLASSES)
+    pg_conn.commit()
+    return False
+
+
+def load_table(sqlite_loader: SQLiteLoader, postgres_saver: PostgresSaver, cls, sizer: BatchSizer,
+               queue_size: int = 4, commit_every: int = COMMIT_EVERY):
+    """Перенос одной таблицы: чтение из SQLite и запись в Postgres идут параллельно через очередь.
+
+    Размер пачки берётся из sizer, который подстраивает его по времени и объёму записи каждой пачки.
+
+    Каждые commit_every пачек транзакция фиксируется вместе с контрольной точкой - id последней
+    записанной строки, - так что прерванная загрузка продолжится с неё. При инкрементальной загрузке
+    читаются только записи не старше сохранённого водяного знака.
+    """
+    pg_conn = postgres_saver.pg_conn
+    state = LoadState(pg_conn)
+    table = state.get(cls)
+    if table.status == DONE:
+        logging.info('%s is already loaded', cls.model)
+        return
+    if table.last_id is not None:
+        logging.info('Resuming %s after id %s', cls.model, table.last_id)
+
+    id_pos = cls.__slots__.index('id')
+    watermark_pos = cls.__slots__.index(watermark_field(cls))
+    mark = table.pending_watermark
+    batches = 0
+
+    def write(data):
+        nonlocal mark, batches
+        rows = as_rows(cls, data)
+        started = time.perf_counter()
+        nbytes = postgres_saver.save_all_data(cls, rows)
+        sizer.observe(len(rows), nbytes, time.perf_counter() - started)
+        mark = max_watermark(rows, watermark_pos, mark)
+        batches += 1
+        if commit_every and batches % commit_every == 0:
+            state.checkpoint(cls, rows[-1][id_pos], mark)
+            pg_conn.commit()
+
+    metrics = postgres_saver.metrics
+    if metrics is not None:
+        metrics.start(cls.model)
+    objs = sqlite_loader.load_objs(cls, FIELDS_MAPPING, sizer, table.watermark, table.last_id)
+    run_pipeline(objs, [write], queue_size)
+    if metrics is not None:
+        metrics.finish(cls.model)
+    if cls.model in postgres_saver.stats:
+        logging.info('%s: %s', cls.model, ', '.join(
+            '{} {}'.format(count, name) for name, count in postgres_saver.stats[cls.model].items()))
+    state.finish(cls, mark)
+    pg_conn.commit()
+
+
+def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection, writer_mode: str = AUTO_MODE,
+                     queue_size: int = 4, full: bool = False, commit_every: int = COMMIT_EVERY,
+                     processes: int = 1, validate: bool = False, batching: dict = None,
+                     bulk: bool = False, unlogged: bool = False, metrics: Metrics = None):
+    """Основной метод загрузки данных из SQLite в Postgres.
+
+    Чтение из SQLite и запись в Postgres идут параллельно через очередь из queue_size пачек.
+    batching - параметры BatchSizer, общие для всех таблиц.
+    bulk - при полной перезагрузке удалить вторичные индексы на время загрузки (см. BulkRebuild).
+    metrics - куда записывать замеры чтения, преобразования и записи.
+    """
+    incremental = prepare(pg_conn, full)
+    rebuild = start_rebuild(pg_conn, CLASSES, bulk and not incremental, unlogged)
+    postgres_saver = PostgresSaver(pg_conn, writer_mode, update=incremental, metrics=metrics)
+    sqlite_loader = get_loader(connection, processes, validate, metrics)
+    sizers = {cls.model: BatchSizer(**(batching or {})) for cls in CLASSES}
+    for cls in CLASSES:
+        load_table(sqlite_loader, postgres_saver, cls, sizers[cls.model], queue_size, commit_every)
+    if rebuild is not None:
+        rebuild.finish()
+    report_batch_sizes(sizers)
+
+
+def load_parallel(sqlite_path: str, pg_params: dict, workers: int, writer_mode: str = AUTO_MODE,
+                  queue_size: int = 4, full: bool = False, commit_every: int = COMMIT_EVERY,
+                  processes: int = 1, validate: bool = False, batching: dict = None,
+                  bulk: bool = False, unlogged: bool = False, metrics: Metrics = None):
+    """Загрузка независимых таблиц одновременно на пуле из workers соединений с Postgres.
+
+    Каждая таблица загружается на своём соединении; таблицы связей начинают загружаться
+    только после завершения таблиц, на которые они ссылаются. В режиме bulk индексы
+    после загрузки создаются параллельно на том же пуле.
+    """
+    sizers = {cls.model: BatchSizer(**(batching or {})) for cls in CLASSES}
+    with pg_pool_context(workers + 1, **pg_params) as pool:
+        with pooled_conn_context(pool) as pg_conn:
+            incremental = prepare(pg_conn, full)
+            rebuild = start_rebuild(pg_conn, CLASSES, bulk and not incremental, unlogged)
+
+        def task(cls):
+            with sqlite_conn_context(sqlite_path) as sqlite_conn, pooled_conn_context(pool) as pg_conn:
+                postgres_saver = PostgresSaver(pg_conn, writer_mode, update=incremental, metrics=metrics)
+                sqlite_loader = get_loader(sqlite_conn, processes, validate, metrics)
+                load_table(sqlite_loader, postgres_saver, cls, sizers[cls.model], queue_size, commit_every)
+
+        run_in_order(CLASSES, task, workers)
+        if rebuild is not None:
+            with pooled_conn_context(pool) as pg_conn:
+                BulkRebuild(pg_conn, CLASSES).finish(pool, workers)
+    report_batch_sizes(sizers)
+
+
+def get_pg_params() -> dict:
+    return {
         'dbname': os.environ.get('DB_NAME'),
         'user': os.environ.get('DB_USER'),
         'password': os.environ.get('DB_PASSWORD'),
@@ -39,10 +183,88 @@ if __name__ == '__main__':
         'port': os.environ.get('DB_PORT', 5432),
         'cursor_factory': DictCursor
     }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sqlite', default='db.sqlite', help='путь к базе SQLite')
+    parser.add_argument('--writer', choices=WRITER_MODES, default=AUTO_MODE,
+                        help='способ записи в PostgreSQL: COPY, INSERT или auto (COPY для пустых таблиц)')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='сколько прочитанных пачек может ждать записи')
+    parser.add_argument('--engine', choices=(SYNC_ENGINE, ASYNC_ENGINE), default=SYNC_ENGINE,
+                        help='запись через psycopg2 или через asyncpg с несколькими пачками в полёте')
+    parser.add_argument('--connections', type=int, default=4,
+                        help='вместе с --engine async: сколько соединений asyncpg и пачек пишутся одновременно')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='сколько таблиц загружать одновременно, каждую на своём соединении')
+    parser.add_argument('--full', action='store_true',
+                        help='полная перезагрузка вместо инкрементальной по водяным знакам modified/created '
+                             'и вместо продолжения прерванной загрузки')
+    parser.add_argument('--commit-every', type=int, default=COMMIT_EVERY,
+                        help='через сколько пачек фиксировать транзакцию и контрольную точку (0 - по таблице)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='сколько процессов читают каждую таблицу SQLite диапазонами id')
+    parser.add_argument('--batch-size', type=int, default=500, help='начальный размер пачки')
+    parser.add_argument('--no-adaptive', action='store_true', help='не подстраивать размер пачки')
+    parser.add_argument('--target-write-seconds', type=float, default=0.5,
+                        help='к какому времени записи одной пачки подстраивать её размер')
+    parser.add_argument('--max-batch-bytes', type=int, default=8 * 1024 * 1024,
+                        help='наибольший объём пачки в байтах')
+    parser.add_argument('--bulk', action='store_true',
+                        help='при полной перезагрузке удалить вторичные индексы и создать их заново после загрузки')
+    parser.add_argument('--unlogged', action='store_true',
+                        help='вместе с --bulk: на время загрузки сделать таблицы UNLOGGED')
+    parser.add_argument('--synchronous-commit-off', action='store_true',
+                        help='загружать с synchronous_commit=off')
+    parser.add_argument('--report', help='куда записать замеры загрузки в JSON')
+    parser.add_argument('--validate', action='store_true',
+                        help='собирать строки в датаклассы models.py (медленнее, для проверки и отладки)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    params = get_pg_params()
+    if args.synchronous_commit_off:
+        params['options'] = '-c synchronous_commit=off'
+    metrics = Metrics()
+    options = {
+        'metrics': metrics,
+        'writer_mode': args.writer,
+        'queue_size': args.queue_size,
+        'full': args.full,
+        'commit_every': args.commit_every,
+        'processes': args.processes,
+        'validate': args.validate,
+        'bulk': args.bulk,
+        'unlogged': args.unlogged,
+        'batching': {
+            'size': args.batch_size,
+            'adaptive': not args.no_adaptive,
+            'target_seconds': args.target_write_seconds,
+            'max_bytes': args.max_batch_bytes,
+        },
+    }
+    failed = True
     try:
-        with sqlite_conn_context('db.sqlite') as sqlite_conn, pg_conn_context(**params) as pg_conn:
-            load_from_sqlite(sqlite_conn, pg_conn)
-    except psycopg2.OperationalError as er:
-        logging.error('psycopg2.OperationalError: %s' % (' '.join(er.args)))
+        if args.engine == ASYNC_ENGINE:
+            from async_engine import load_async
+            with pg_conn_context(**params) as pg_conn:
+                asyncio.run(load_async(args.sqlite, pg_conn, params, args.connections, **options))
+        elif args.workers > 1:
+            load_parallel(args.sqlite, params, args.workers, **options)
+        else:
+            with sqlite_conn_context(args.sqlite) as sqlite_conn, pg_conn_context(**params) as pg_conn:
+                load_from_sqlite(sqlite_conn, pg_conn, **options)
+        failed = False
+    except psycopg2.Error as er:
+        logging.error('%s: %s' % (er.__class__.__name__, ' '.join(er.args)))
     except sqlite3.OperationalError as er:
         logging.error('sqlite3.OperationalError: %s' % (' '.join(er.args)))
+    logging.info('Load summary:\n%s', metrics.summary())
+    if failed:
+        # без отчёта и с ненулевым кодом, чтобы неудачная загрузка не попала в замеры benchmark.py
+        sys.exit(1)
+    if args.report:
+        metrics.write_json(args.report)
@@ -0,0 +1,159 @@
+"""Замеры загрузки: строки, объём, скорость и задержки пачек по таблицам."""
+import bisect
+import json
+import resource
+import threading
+import time
+from dataclasses import dataclass, field
+
+READ = 'read'
+CONVERT = 'convert'
+WRITE = 'write'
+STAGES = (READ, CONVERT, WRITE)
+
+# верхние границы корзин гистограммы задержек, мс
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf'))
+
+
+@dataclass
+class Histogram:
+    counts: list = field(default_factory=lambda: [0] * len(BUCKETS_MS))
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'max_ms': self.max,
+            'buckets_ms': {str(bound): count for bound, count in zip(BUCKETS_MS, self.counts)},
+        }
+
+
+@dataclass
+class TableMetrics:
+    rows: int = 0
+    bytes: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    started: float = None
+    finished: float = None
+    stages: dict = field(default_factory=lambda: {stage: Histogram() for stage in STAGES})
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'rows_per_second': self.rows / self.seconds if self.seconds else 0.0,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'latency': {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+        }
+
+
+class Metrics:
+    """Потокобезопасный сборщик замеров одного запуска загрузки."""
+
+    def __init__(self):
+        self.tables = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _table(self, model: str) -> TableMetrics:
+        if model not in self.tables:
+            self.tables[model] = TableMetrics()
+        return self.tables[model]
+
+    def start(self, model: str):
+        with self._lock:
+            self._table(model).started = time.perf_counter()
+
+    def finish(self, model: str):
+        with self._lock:
+            self._table(model).finished = time.perf_counter()
+
+    def observe(self, model: str, stage: str, seconds: float, rows: int = 0, nbytes: int = 0):
+        with self._lock:
+            table = self._table(model)
+            table.stages[stage].add(seconds)
+            table.rows += rows
+            table.bytes += nbytes
+
+    def count(self, model: str, inserted: int = 0, updated: int = 0, unchanged: int = 0):
+        with self._lock:
+            table = self._table(model)
+            table.inserted += inserted
+            table.updated += updated
+            table.unchanged += unchanged
+
+    @staticmethod
+    def peak_rss_mb() -> dict:
+        """Пиковый RSS процесса и его дочерних процессов (читателей SQLite), МБ."""
+        return {
+            'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        }
+
+    def report(self) -> dict:
+        with self._lock:
+            seconds = time.perf_counter() - self.started
+            rows = sum(table.rows for table in self.tables.values())
+            return {
+                'seconds': seconds,
+                'rows': rows,
+                'rows_per_second': rows / seconds if seconds else 0.0,
+                'peak_rss_mb': self.peak_rss_mb(),
+                'tables': {model: table.as_dict() for model, table in self.tables.items()},
+            }
+
+    def summary(self) -> str:
+        report = self.report()
+        header = '{:<18}{:>12}{:>10}{:>12}{:>10}{:>10}{:>10}'.format(
+            'table', 'rows', 'MB', 'rows/s', 'inserted', 'updated', 'unchanged') + ''.join(
+            '{:>22}'.format('{} p50/p95 ms'.format(stage)) for stage in STAGES)
+        lines = [header, '-' * len(header)]
+        for model, table in report['tables'].items():
+            lines.append('{:<18}{:>12}{:>10.1f}{:>12.0f}{:>10}{:>10}{:>10}'.format(
+                model, table['rows'], table['bytes'] / 1024 / 1024, table['rows_per_second'],
+                table['inserted'], table['updated'], table['unchanged'],
+            ) + ''.join('{:>22}'.format('{:.1f}/{:.1f}'.format(
+                table['latency'][stage]['p50_ms'], table['latency'][stage]['p95_ms'])) for stage in STAGES))
+        lines.append('-' * len(header))
+        lines.append('total {} rows in {:.1f} s ({:.0f} rows/s), peak RSS {:.0f} MB (readers {:.0f} MB)'.format(
+            report['rows'], report['seconds'], report['rows_per_second'],
+            report['peak_rss_mb']['self'], report['peak_rss_mb']['children']))
+        return '\n'.join(lines)
+
+    def write_json(self, path: str):
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
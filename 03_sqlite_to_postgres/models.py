@@ -48,8 +48,8 @@ class PersonFilmWork:
     __slots__ = ('id', 'film_work_id', 'person_id', 'role', 'created')
 
     id: uuid.UUID
-    film_work_id: str
-    person_id: str
+    film_work_id: uuid.UUID
+    person_id: uuid.UUID
     role: str
     created: datetime.datetime
 
@@ -60,6 +60,6 @@ class GenreFilmWork:
     __slots__ = ('id', 'film_work_id', 'genre_id', 'created')
 
     id: uuid.UUID
-    film_work_id: str
-    genre_id: str
+    film_work_id: uuid.UUID
+    genre_id: uuid.UUID
     created: datetime.datetime
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Конвейер чтения и записи пачек с ограниченной очередью."""
+import queue
+import threading
+
+_DONE = object()
+
+
+def run_pipeline(batches, writers, queue_size: int = 4):
+    """Читает пачки в текущем потоке и передаёт их писателям, каждый из которых работает в своём потоке.
+
+    Очередь между чтением и записью ограничена queue_size пачками, так что в памяти одновременно
+    находится не больше queue_size + len(writers) пачек.
+    Ошибка любого писателя останавливает чтение, остальные писатели дочитывают очередь вхолостую,
+    после чего ошибка пробрасывается вызывающему коду.
+    """
+    tasks = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def work(write):
+        while (batch := tasks.get()) is not _DONE:
+            if stop.is_set():
+                continue
+            try:
+                write(batch)
+            except BaseException as er:
+                errors.append(er)
+                stop.set()
+
+    threads = [threading.Thread(target=work, args=(write,), daemon=True) for write in writers]
+
+    def put(item) -> bool:
+        while True:
+            try:
+                tasks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not any(thread.is_alive() for thread in threads):
+                    return False
+
+    for thread in threads:
+        thread.start()
+    try:
+        for batch in batches:
+            if stop.is_set() or not put(batch):
+                break
+    except BaseException as er:
+        errors.append(er)
+        stop.set()
+    finally:
+        for _ in threads:
+            put(_DONE)
+        for thread in threads:
+            thread.join()
+        if hasattr(batches, 'close'):
+            batches.close()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,34 @@
+"""Параллельная загрузка таблиц в порядке зависимостей по внешним ключам."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+
+
+def dependency_graph(classes) -> dict:
+    """Граф зависимостей таблиц: поле <table>_id ссылается на таблицу с model == <table>."""
+    by_table = {cls.model: cls for cls in classes}
+    return {
+        cls: {by_table[name[:-3]] for name in cls.__slots__ if name.endswith('_id') and name[:-3] in by_table}
+        for cls in classes
+    }
+
+
+def run_in_order(classes, task, workers: int):
+    """Вызывает task(cls) для каждой таблицы в пуле из workers потоков.
+
+    Таблица запускается только после того, как загружены все таблицы, на которые она ссылается,
+    поэтому независимые таблицы загружаются одновременно.
+    Ошибка в любой таблице прекращает запуск новых и пробрасывается после завершения уже запущенных.
+    """
+    sorter = TopologicalSorter(dependency_graph(classes))
+    sorter.prepare()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while sorter.is_active():
+            for cls in sorter.get_ready():
+                running[executor.submit(task, cls)] = cls
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                cls: dataclass = running.pop(future)
+                future.result()
+                sorter.done(cls)
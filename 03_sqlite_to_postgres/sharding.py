@@ -0,0 +1,112 @@
+"""Чтение таблиц SQLite диапазонами id в нескольких процессах."""
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Union
+
+from converters import compile_converter
+from batching import BatchSizer, size_of
+from helpers import get_fields, select_conditions, where_clause
+from metrics import Metrics, READ, CONVERT
+
+MMAP_SIZE = 1 << 30
+
+_connection = None
+
+
+def connect_readonly(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect('{}?mode=ro'.format(Path(db_path).resolve().as_uri()), uri=True)
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute('PRAGMA mmap_size = {}'.format(MMAP_SIZE))
+    return conn
+
+
+def _init_worker(db_path: str):
+    global _connection
+    _connection = connect_readonly(db_path)
+
+
+def _read_range(query: str, args: tuple, instance: dataclass, validate: bool):
+    """Строки диапазона, время их чтения и время преобразования."""
+    started = time.perf_counter()
+    records = _connection.execute(query, args).fetchall()
+    read = time.perf_counter()
+    convert = compile_converter(instance, validate=validate)
+    if convert is not None:
+        records = [convert(record) for record in records]
+    return records, read - started, time.perf_counter() - read
+
+
+@dataclass
+class ShardedSQLiteLoader:
+    """Тот же интерфейс, что у SQLiteLoader, но строки читаются и преобразуются в processes процессах.
+
+    Таблица делится на диапазоны id по batch_size строк: границы находятся по индексу первичного ключа,
+    без чтения самих строк. Каждый процесс читает диапазоны через своё соединение только для чтения.
+    Пачки отдаются в порядке id, поэтому контрольные точки загрузки работают так же, как с SQLiteLoader,
+    а в памяти одновременно находится не больше 2 * processes прочитанных пачек.
+    Строки преобразуются compile_converter в процессах-читателях, а с validate=True собираются в датаклассы
+    в основном процессе. Загрузчик вызывается из потоков (--workers, --engine async), поэтому процессы
+    запускаются через forkserver, а не копированием многопоточного процесса.
+    """
+    db_path: str
+    processes: int = field(default_factory=os.cpu_count)
+    validate: bool = False
+    metrics: Metrics = None
+
+    def ranges(self, conn: sqlite3.Connection, instance: dataclass, conditions: list, args: list,
+               batch_size: Union[int, BatchSizer], after: str = None):
+        low = after
+        while True:
+            range_conditions = conditions + (['id > ?'] if low is not None else [])
+            range_args = args + ([low] if low is not None else [])
+            row = conn.execute(
+                'SELECT id FROM {table}{where} ORDER BY id LIMIT 1 OFFSET ?'.format(
+                    table=instance.model, where=where_clause(range_conditions)),
+                range_args + [size_of(batch_size) - 1],
+            ).fetchone()
+            high = row[0] if row else None
+            yield low, high
+            if high is None:
+                return
+            low = high
+
+    def load_objs(self, instance: dataclass, fields_mapping: dict = None, batch_size: Union[int, BatchSizer] = 500,
+                  since: str = None, after: str = None):
+        conditions, args = select_conditions(instance, fields_mapping, since)
+        fields = get_fields(instance.__slots__, fields_mapping)
+        conn = connect_readonly(self.db_path)
+        try:
+            with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('forkserver'),
+                                     initializer=_init_worker, initargs=(self.db_path,)) as pool:
+                pending = deque()
+                for low, high in self.ranges(conn, instance, conditions, args, batch_size, after):
+                    range_conditions = conditions + (['id > ?'] if low is not None else []) \
+                        + (['id <= ?'] if high is not None else [])
+                    range_args = args + ([low] if low is not None else []) + ([high] if high is not None else [])
+                    query = 'SELECT {fields} FROM {table}{where} ORDER BY id'.format(
+                        fields=fields, table=instance.model, where=where_clause(range_conditions))
+                    pending.append(pool.submit(_read_range, query, tuple(range_args), instance, self.validate))
+                    if len(pending) >= 2 * self.processes:
+                        yield from self._batches(instance, pending.popleft())
+                while pending:
+                    yield from self._batches(instance, pending.popleft())
+        except sqlite3.Error as er:
+            logging.error('SQLite error: %s' % (' '.join(er.args)))
+            raise
+        finally:
+            conn.close()
+
+    def _batches(self, instance: dataclass, future):
+        records, read_seconds, convert_seconds = future.result()
+        if self.metrics is not None and records:
+            self.metrics.observe(instance.model, READ, read_seconds)
+            self.metrics.observe(instance.model, CONVERT, convert_seconds)
+        if records:
+            yield [instance(*record) for record in records] if self.validate else records
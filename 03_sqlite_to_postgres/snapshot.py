@@ -0,0 +1,137 @@
+"""Снимок таблиц content в сжатом поколоночном формате: выгрузка и загрузка обратно через COPY.
+
+Файл <table>.snap:
+- строка MAGIC и строка JSON с именем таблицы и списком столбцов;
+- группы строк: 4 байта - число строк n (big-endian), затем для каждого столбца 4 байта длины и
+  сжатый zlib текст из n значений в текстовом формате COPY, разделённых переводом строки;
+- группа из 0 строк завершает файл.
+Значения одного столбца лежат рядом, поэтому сжимаются лучше построчного дампа. И при выгрузке
+(курсор на стороне сервера), и при загрузке в памяти находится одна группа строк.
+"""
+import argparse
+import io
+import json
+import logging
+import struct
+import zlib
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ, connection as _connection
+
+from bulk import start_rebuild
+from contexts import pg_conn_context
+from helpers import COPY_ESCAPES
+from load_data import CLASSES, get_pg_params, truncate
+from scheduler import dependency_graph
+from state import LoadState
+
+MAGIC = b'CONTENT-SNAPSHOT 1\n'
+ROW_GROUP = 50000
+LENGTH = struct.Struct('>I')
+
+
+def snapshot_path(directory: Path, cls) -> Path:
+    return directory / '{}.snap'.format(cls.model)
+
+
+def write_row_group(snapshot, rows: list, columns: int, level: int):
+    snapshot.write(LENGTH.pack(len(rows)))
+    for pos in range(columns):
+        column = '\n'.join('\\N' if row[pos] is None else row[pos].translate(COPY_ESCAPES) for row in rows)
+        packed = zlib.compress(column.encode(), level)
+        snapshot.write(LENGTH.pack(len(packed)))
+        snapshot.write(packed)
+
+
+def read_row_groups(snapshot, columns: int):
+    """Группы строк файла в виде списков столбцов со значениями в текстовом формате COPY."""
+    while True:
+        rows, = LENGTH.unpack(snapshot.read(LENGTH.size))
+        if not rows:
+            return
+        group = []
+        for _ in range(columns):
+            size, = LENGTH.unpack(snapshot.read(LENGTH.size))
+            group.append(zlib.decompress(snapshot.read(size)).decode().split('\n'))
+        yield group
+
+
+def export_table(pg_conn: _connection, cls, directory: Path, row_group: int = ROW_GROUP, level: int = 6) -> int:
+    columns = cls.__slots__
+    with pg_conn.cursor(name='snapshot_{}'.format(cls.model)) as cursor, \
+            open(snapshot_path(directory, cls), 'wb') as snapshot:
+        cursor.itersize = row_group
+        cursor.execute('SELECT {} FROM content.{} ORDER BY id'.format(
+            ', '.join('{}::text'.format(name) for name in columns), cls.model))
+        snapshot.write(MAGIC)
+        snapshot.write(json.dumps({'table': cls.model, 'columns': columns}).encode() + b'\n')
+        total = 0
+        while rows := cursor.fetchmany(row_group):
+            write_row_group(snapshot, rows, len(columns), level)
+            total += len(rows)
+        snapshot.write(LENGTH.pack(0))
+    return total
+
+
+def import_table(pg_conn: _connection, cls, directory: Path) -> int:
+    with open(snapshot_path(directory, cls), 'rb') as snapshot, pg_conn.cursor() as cursor:
+        if snapshot.readline() != MAGIC:
+            raise ValueError('{} is not a content snapshot'.format(snapshot.name))
+        header = json.loads(snapshot.readline())
+        columns = header['columns']
+        total = 0
+        for group in read_row_groups(snapshot, len(columns)):
+            buffer = io.StringIO('\n'.join('\t'.join(values) for values in zip(*group)) + '\n')
+            cursor.copy_expert('COPY content.{} ({}) FROM STDIN'.format(cls.model, ', '.join(columns)), buffer)
+            total += len(group[0])
+    return total
+
+
+def export_snapshot(pg_conn: _connection, directory: Path, row_group: int = ROW_GROUP, level: int = 6):
+    """Выгружает таблицы в одной транзакции REPEATABLE READ, чтобы все они соответствовали одному состоянию базы
+    и связи не ссылались на записи, добавленные или удалённые во время выгрузки."""
+    directory.mkdir(parents=True, exist_ok=True)
+    isolation_level, readonly = pg_conn.isolation_level, pg_conn.readonly
+    pg_conn.set_session(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+    try:
+        for cls in CLASSES:
+            logging.info('Exported %s rows of %s', export_table(pg_conn, cls, directory, row_group, level), cls.model)
+    finally:
+        pg_conn.rollback()
+        pg_conn.set_session(isolation_level=isolation_level, readonly=readonly)
+
+
+def import_snapshot(pg_conn: _connection, directory: Path, bulk: bool = False):
+    """Заменяет содержимое таблиц снимком; таблицы очищаются и загружаются в порядке зависимостей одной транзакцией.
+
+    С bulk удаление индексов фиксируется отдельно до неё, так что ошибка загрузки оставляет прежние данные;
+    индексы, удалённые прерванной загрузкой, создаются заново и без bulk. Водяные знаки и контрольные точки
+    load_data.py к снимку не относятся и сбрасываются в той же транзакции.
+    """
+    rebuild = start_rebuild(pg_conn, CLASSES, bulk)
+    truncate(pg_conn)
+    state = LoadState(pg_conn)
+    state.ensure()
+    state.reset()
+    for cls in TopologicalSorter(dependency_graph(CLASSES)).static_order():
+        logging.info('Imported %s rows of %s', import_table(pg_conn, cls, directory), cls.model)
+    pg_conn.commit()
+    if rebuild is not None:
+        rebuild.finish()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('directory', type=Path, help='каталог снимка')
+    parser.add_argument('--row-group', type=int, default=ROW_GROUP, help='строк в группе при выгрузке')
+    parser.add_argument('--level', type=int, default=6, help='уровень сжатия zlib при выгрузке')
+    parser.add_argument('--bulk', action='store_true', help='при загрузке создать вторичные индексы после данных')
+    args = parser.parse_args()
+
+    with pg_conn_context(**get_pg_params()) as pg_conn:
+        if args.command == 'export':
+            export_snapshot(pg_conn, args.directory, args.row_group, args.level)
+        else:
+            import_snapshot(pg_conn, args.directory, args.bulk)
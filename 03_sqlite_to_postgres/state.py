@@ -0,0 +1,93 @@
+"""Состояние загрузки, хранящееся в Postgres рядом с данными."""
+from dataclasses import dataclass
+from typing import Optional
+
+from psycopg2.extensions import connection as _connection
+
+STATE_TABLE = 'content.load_state'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+
+
+@dataclass(frozen=True)
+class TableState:
+    watermark: Optional[str]
+    status: str
+    last_id: Optional[str]
+    pending_watermark: Optional[str]
+    incremental: bool
+
+
+@dataclass
+class LoadState:
+    """Состояние загрузки по таблицам.
+
+    watermark - наибольшее значение modified (или created), перенесённое последней завершённой загрузкой.
+    last_id и pending_watermark - контрольная точка текущей загрузки: id последней зафиксированной пачки
+    и наибольший водяной знак среди уже записанных строк.
+    Всё записывается в той же транзакции, что и данные, поэтому не может опередить их.
+    """
+    pg_conn: _connection
+
+    def ensure(self):
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                table_name text PRIMARY KEY,
+                watermark text,
+                status text NOT NULL DEFAULT '{DONE}',
+                last_id text,
+                pending_watermark text,
+                incremental boolean NOT NULL DEFAULT false,
+                updated timestamp with time zone NOT NULL DEFAULT now()
+            )
+            """)
+
+    def load(self) -> dict:
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            SELECT table_name, watermark, status, last_id, pending_watermark, incremental FROM {STATE_TABLE}
+            """)
+            return {row[0]: TableState(*row[1:]) for row in cursor.fetchall()}
+
+    def get(self, cls: dataclass) -> TableState:
+        return self.load()[cls.model]
+
+    def begin_full(self, classes):
+        """Новая полная загрузка: водяные знаки сбрасываются."""
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {STATE_TABLE}")
+            cursor.executemany(f"INSERT INTO {STATE_TABLE} (table_name, status) VALUES (%s, '{PENDING}')",
+                               [(cls.model,) for cls in classes])
+
+    def reset(self):
+        """Забывает загрузку: следующий запуск load_data.py будет полной перезагрузкой."""
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {STATE_TABLE}")
+
+    def begin_incremental(self):
+        """Новая инкрементальная загрузка от сохранённых водяных знаков."""
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            UPDATE {STATE_TABLE}
+            SET status = '{PENDING}', last_id = NULL, pending_watermark = watermark, incremental = true,
+                updated = now()
+            """)
+
+    def checkpoint(self, cls: dataclass, last_id: str, pending_watermark: Optional[str]):
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            UPDATE {STATE_TABLE}
+            SET status = '{RUNNING}', last_id = %s, pending_watermark = %s, updated = now()
+            WHERE table_name = %s
+            """, (last_id, pending_watermark, cls.model))
+
+    def finish(self, cls: dataclass, watermark: Optional[str]):
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+            UPDATE {STATE_TABLE}
+            SET status = '{DONE}', watermark = %s, last_id = NULL, pending_watermark = NULL, updated = now()
+            WHERE table_name = %s
+            """, (watermark, cls.model))
@@ -1,5 +1,5 @@
-from helpers import get_fields
 from load_data import *
+from verify import verify_tables
 from models import Movie, Genre, Person, PersonFilmWork, GenreFilmWork
 
 load_dotenv(dotenv_path='../../../02_movies_admin/.env')
@@ -34,19 +34,6 @@ def test_tables_count_equals():
 def test_tables_rows_equals():
     """Проверка содержимого записей внутри каждой таблицы. Время добавления/изменения можно опустить."""
 
-    with sqlite_conn_context(sqlite_path) as sqlite_conn, pg_conn_context(**params) as pg_conn:
-        classes = (Movie, Genre, Person, GenreFilmWork, PersonFilmWork)
-        sqlite_cur = sqlite_conn.cursor()
-        cur = pg_conn.cursor()
-        for cls in classes:
-            fields = list(cls.__slots__)
-            if 'created' in fields:
-                fields.remove('created')
-            if 'modified' in fields:
-                fields.remove('modified')
-            query = 'SELECT {fields} FROM {table} ORDER BY id'.format(fields=get_fields(fields), table=cls.model)
-
-            sqlite_cur.execute(query)
-            cur.execute(query)
-            while (sqlite_record := sqlite_cur.fetchmany(500)) and (pg_record := cur.fetchmany(500)):
-                assert all([a == b for a, b in zip(sqlite_record, pg_record)])
+    classes = (Movie, Genre, Person, GenreFilmWork, PersonFilmWork)
+    differences = verify_tables(sqlite_path, params, classes)
+    assert differences == {cls.model: [] for cls in classes}
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# модули загрузчика лежат на уровень выше каталога тестов
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,95 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from async_engine import load_table_async
+from batching import BatchSizer
+from models import Genre
+from state import DONE, PENDING, TableState
+
+BATCHES = 8
+ROWS = 5
+
+
+def batch(seq):
+    return [('{:04}'.format(seq * ROWS + pos), 'name', None, None, '2021-01-{:02}'.format(seq + 1))
+            for pos in range(ROWS)]
+
+
+class Loader:
+    def load_objs(self, cls, fields_mapping, sizer, since, after):
+        for seq in range(BATCHES):
+            yield batch(seq)
+
+
+class Saver:
+    """Первая пачка пишется дольше остальных, так что пачки завершаются не по порядку."""
+    metrics = None
+
+    def __init__(self):
+        self.stats = {}
+        self.written = set()
+
+    async def save_all_data(self, cls, rows):
+        await asyncio.sleep(0.05 if rows[0][0] == '0000' else 0.001)
+        self.written.add(rows[-1][0])
+        return 1
+
+
+class Connection:
+    def commit(self):
+        pass
+
+
+class State:
+    pg_conn = Connection()
+
+    def __init__(self, saver):
+        self.saver = saver
+        self.checkpoints = []
+        self.finished = None
+
+    def get(self, cls):
+        return TableState(None, PENDING, None, None, False)
+
+    def checkpoint(self, cls, last_id, mark):
+        # контрольная точка не опережает ни одну незаписанную пачку
+        assert all(batch(seq)[-1][0] in self.saver.written for seq in range(int(last_id) // ROWS + 1))
+        self.checkpoints.append((last_id, mark))
+
+    def finish(self, cls, mark):
+        self.finished = mark
+
+
+def test_checkpoints_follow_contiguous_prefix():
+    """Пачки пишутся одновременно, а контрольная точка сдвигается только по записанным без пропусков."""
+    saver = Saver()
+    state = State(saver)
+
+    async def load():
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            await load_table_async(Loader(), saver, state, Genre, BatchSizer(), writers=4, reader=reader,
+                                   commit_every=1)
+
+    asyncio.run(load())
+    assert len(saver.written) == BATCHES
+    assert state.checkpoints
+    last_ids = [last_id for last_id, mark in state.checkpoints]
+    assert last_ids == sorted(last_ids)
+    assert state.checkpoints[-1] == (batch(BATCHES - 1)[-1][0], '2021-01-{:02}'.format(BATCHES))
+    assert state.finished == '2021-01-{:02}'.format(BATCHES)
+
+
+def test_done_table_is_skipped():
+    class DoneState(State):
+        def get(self, cls):
+            return TableState(None, DONE, None, None, False)
+
+    saver = Saver()
+    state = DoneState(saver)
+
+    async def load():
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            await load_table_async(Loader(), saver, state, Genre, BatchSizer(), writers=4, reader=reader)
+
+    asyncio.run(load())
+    assert not saver.written
@@ -0,0 +1,34 @@
+from batching import BatchSizer, size_of
+
+
+def test_grows_at_most_twice():
+    sizer = BatchSizer(size=100)
+    sizer.observe(100, 1000, 0.001)
+    assert sizer.size == 200
+
+
+def test_shrinks_to_target_time():
+    sizer = BatchSizer(size=1000, target_seconds=0.5)
+    sizer.observe(1000, 1000, 2.0)
+    assert sizer.size == 250
+
+
+def test_limited_by_bytes_and_bounds():
+    sizer = BatchSizer(size=1000, max_bytes=1000)
+    sizer.observe(1000, 100000, 0.001)
+    assert sizer.size == sizer.min_size
+    sizer = BatchSizer(size=40000, max_size=50000)
+    sizer.observe(40000, 1, 0.001)
+    assert sizer.size == 50000
+
+
+def test_not_adaptive_and_empty_batches():
+    sizer = BatchSizer(size=300, adaptive=False)
+    sizer.observe(300, 1000, 10.0)
+    assert sizer.size == 300
+    sizer = BatchSizer(size=300)
+    sizer.observe(0, 0, 0.0)
+    assert sizer.size == 300
+    assert sizer.sizes == [300]
+    assert size_of(sizer) == 300
+    assert size_of(7) == 7
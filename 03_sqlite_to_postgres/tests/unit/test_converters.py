@@ -0,0 +1,60 @@
+import datetime
+import uuid
+
+import pytest
+
+from async_engine import text_size
+from converters import PYTHON, compile_converter
+from helpers import copy_buffer
+from models import Genre, Movie, PersonFilmWork
+
+ID = '3fa85f64-5717-4562-b3fc-2c963f66afa6'
+CREATED = '2021-06-16 20:14:09.221838+00'
+
+
+def test_text_passes_values_through():
+    """По умолчанию uuid и время передаются как есть, без разбора; float приводится к числу."""
+    assert compile_converter(PersonFilmWork) is None
+    assert compile_converter(Genre) is None
+    convert = compile_converter(Movie)
+    row = ('not-a-uuid', 'title', None, '2020-01-01', 5, 'movie', CREATED, CREATED)
+    assert convert(row) == ('not-a-uuid', 'title', None, '2020-01-01', 5.0, 'movie', CREATED, CREATED)
+
+
+def test_text_validate_checks_values():
+    """С validate значения проверяются разбором, но передаются в исходном виде."""
+    convert = compile_converter(PersonFilmWork, validate=True)
+    row = (ID, ID, ID, 'actor', CREATED)
+    assert convert(row) == row
+    assert convert((ID, ID, ID, 'actor', None)) == (ID, ID, ID, 'actor', None)
+    with pytest.raises(ValueError):
+        convert(('not-a-uuid', ID, ID, 'actor', CREATED))
+
+
+def test_python_converts_to_annotated_types():
+    """PYTHON приводит значения к типам из аннотаций датакласса."""
+    convert = compile_converter(Movie, PYTHON)
+    converted = convert((ID, 'title', None, '2020-01-01', '5.5', 'movie', CREATED, CREATED))
+    assert converted[0] == uuid.UUID(ID)
+    assert converted[2] is None
+    assert converted[3] == datetime.date(2020, 1, 1)
+    assert converted[4] == 5.5
+    assert converted[6] == datetime.datetime(2021, 6, 16, 20, 14, 9, 221838, tzinfo=datetime.timezone.utc)
+
+
+def test_foreign_keys_are_memoized():
+    """Повторяющиеся внешние ключи разбираются один раз, уникальные id - каждый раз."""
+    convert = compile_converter(PersonFilmWork, PYTHON)
+    first = convert((ID, ID, ID, 'actor', CREATED))
+    second = convert((ID, ID, ID, 'actor', CREATED))
+    assert first[1] is second[1]
+    assert first[2] is second[2]
+    assert first[0] is not second[0]
+
+
+def test_copy_buffer_measures_bytes():
+    """Объём пачки для COPY считается в байтах кодировки соединения, а не в символах."""
+    buffer = copy_buffer([('Амели', None, 1)])
+    assert buffer.read() == 'Амели\t\\N\t1\n'.encode()
+    assert buffer.getbuffer().nbytes == 16
+    assert text_size([('Амели', None, 1)]) == 11
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from pipeline import run_pipeline
+
+
+def test_all_batches_are_written():
+    """Каждая пачка записывается ровно одним писателем."""
+    written, lock = [], threading.Lock()
+
+    def write(batch):
+        with lock:
+            written.append(batch)
+
+    run_pipeline(iter(range(100)), [write, write, write], queue_size=2)
+    assert sorted(written) == list(range(100))
+
+
+def test_writer_error_stops_reader():
+    """Ошибка писателя останавливает чтение и пробрасывается."""
+    read = []
+
+    def batches():
+        for batch in range(10000):
+            read.append(batch)
+            yield batch
+
+    def write(batch):
+        raise ValueError('write failed')
+
+    with pytest.raises(ValueError, match='write failed'):
+        run_pipeline(batches(), [write, write], queue_size=2)
+    assert len(read) < 100
+
+
+def test_reader_error_is_raised():
+    """Ошибка чтения останавливает писателей и пробрасывается; потоки писателей завершаются."""
+    written = []
+
+    def batches():
+        yield 1
+        yield 2
+        raise RuntimeError('read failed')
+
+    with pytest.raises(RuntimeError, match='read failed'):
+        run_pipeline(batches(), [written.append])
+    assert set(written) <= {1, 2}
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from models import Genre, GenreFilmWork, Movie, Person, PersonFilmWork
+from scheduler import dependency_graph, run_in_order
+
+CLASSES = (Movie, Genre, Person, GenreFilmWork, PersonFilmWork)
+
+
+def test_dependency_graph():
+    """Таблицы связей зависят от таблиц, на которые ссылаются их поля *_id."""
+    graph = dependency_graph(CLASSES)
+    assert graph[Movie] == set()
+    assert graph[GenreFilmWork] == {Movie, Genre}
+    assert graph[PersonFilmWork] == {Movie, Person}
+
+
+def test_tables_start_after_their_dependencies():
+    """Таблица запускается только после загрузки всех таблиц, на которые она ссылается."""
+    finished, lock = set(), threading.Lock()
+    started_before = {}
+
+    def task(cls):
+        with lock:
+            started_before[cls] = set(finished)
+        time.sleep(0.01)
+        with lock:
+            finished.add(cls)
+
+    run_in_order(CLASSES, task, workers=3)
+    assert finished == set(CLASSES)
+    graph = dependency_graph(CLASSES)
+    for cls in CLASSES:
+        assert graph[cls] <= started_before[cls]
+
+
+def test_failure_cancels_dependent_tables():
+    """Ошибка таблицы пробрасывается, а зависящие от неё таблицы не запускаются."""
+    started = []
+
+    def task(cls):
+        started.append(cls)
+        if cls is Movie:
+            raise ValueError('movie failed')
+
+    with pytest.raises(ValueError, match='movie failed'):
+        run_in_order(CLASSES, task, workers=3)
+    assert GenreFilmWork not in started
+    assert PersonFilmWork not in started
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from generate_data import generate
+from helpers import SQLiteLoader
+from load_data import CLASSES, FIELDS_MAPPING
+from sharding import ShardedSQLiteLoader
+
+
+@pytest.fixture(scope='module')
+def sqlite_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('sharding') / 'db.sqlite'
+    generate(str(path), 300)
+    return str(path)
+
+
+@pytest.mark.parametrize('validate', (False, True))
+def test_sharded_loader_reads_like_plain_loader(sqlite_path, validate):
+    """Чтение диапазонами id в нескольких процессах даёт те же пачки в том же порядке, что и SQLiteLoader."""
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        plain = SQLiteLoader(conn, validate)
+        sharded = ShardedSQLiteLoader(sqlite_path, 2, validate)
+        for cls in CLASSES:
+            expected = list(plain.load_objs(cls, FIELDS_MAPPING, 70))
+            batches = list(sharded.load_objs(cls, FIELDS_MAPPING, 70))
+            assert batches == expected
+    finally:
+        conn.close()
+
+
+def test_sharded_loader_resumes_after_id(sqlite_path):
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        cls = CLASSES[-1]
+        rows = [row for rows in SQLiteLoader(conn).load_objs(cls, FIELDS_MAPPING, 100) for row in rows]
+        after = rows[len(rows) // 2][0]
+        resumed = [row for rows in ShardedSQLiteLoader(sqlite_path, 2).load_objs(cls, FIELDS_MAPPING, 100, after=after)
+                   for row in rows]
+        assert resumed == rows[len(rows) // 2 + 1:]
+    finally:
+        conn.close()
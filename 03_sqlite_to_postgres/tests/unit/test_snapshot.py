@@ -0,0 +1,24 @@
+import io
+
+from helpers import COPY_ESCAPES
+from snapshot import LENGTH, read_row_groups, write_row_group
+
+
+def test_row_groups_round_trip():
+    """Группы строк читаются обратно значениями в текстовом формате COPY, со спецсимволами и NULL."""
+    groups = [
+        [('1', 'tab\there', None), ('2', 'new\nline', 'back\\slash')],
+        [('3', 'кириллица', '')],
+    ]
+    snapshot = io.BytesIO()
+    for rows in groups:
+        write_row_group(snapshot, rows, 3, 6)
+    snapshot.write(LENGTH.pack(0))
+    snapshot.seek(0)
+
+    read = list(read_row_groups(snapshot, 3))
+    expected = [
+        [tuple('\\N' if value is None else value.translate(COPY_ESCAPES) for value in row) for row in rows]
+        for rows in groups
+    ]
+    assert [list(zip(*group)) for group in read] == expected
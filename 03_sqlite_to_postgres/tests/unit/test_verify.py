@@ -0,0 +1,40 @@
+import hashlib
+import sqlite3
+
+from verify import hex_part, next_prefix, row_md5, uuid_bound
+
+
+def test_uuid_bound():
+    assert uuid_bound('') == '00000000-0000-0000-0000-000000000000'
+    assert uuid_bound('ab') == 'ab000000-0000-0000-0000-000000000000'
+
+
+def test_next_prefix():
+    assert next_prefix('a') == 'b'
+    assert next_prefix('a9') == 'aa'
+    assert next_prefix('af') == 'b'
+    assert next_prefix('0ff') == '1'
+    assert next_prefix('ff') is None
+
+
+def test_row_md5_matches_postgres_text():
+    """Строка хешируется в том виде, в каком её значения выводит ::text в Postgres."""
+    assert row_md5('x', None, 5.0, 2.5) == hashlib.md5('x|\\N|5|2.5'.encode()).hexdigest()
+
+
+def test_sqlite_functions_sum_like_python():
+    """Суммы hex_part(row_md5(...)) в SQLite совпадают с посчитанными в Python."""
+    rows = [('a', 1.0), ('b', None), ('c', 2.5)]
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.create_function('row_md5', -1, row_md5, deterministic=True)
+        conn.create_function('hex_part', 2, hex_part, deterministic=True)
+        conn.execute('CREATE TABLE t (name TEXT, rating FLOAT)')
+        conn.executemany('INSERT INTO t VALUES (?, ?)', rows)
+        result = conn.execute(
+            'SELECT count(*), sum(hex_part(h, 0)), sum(hex_part(h, 8)) FROM (SELECT row_md5(name, rating) AS h FROM t)'
+        ).fetchone()
+    finally:
+        conn.close()
+    digests = [row_md5(*row) for row in rows]
+    assert result == (3, sum(hex_part(d, 0) for d in digests), sum(hex_part(d, 8) for d in digests))
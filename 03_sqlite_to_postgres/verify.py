@@ -0,0 +1,161 @@
+"""Сверка таблиц SQLite и Postgres по контрольным суммам диапазонов id.
+
+Таблица делится на диапазоны по шестнадцатеричному префиксу uuid. Для диапазона с каждой стороны
+считается число строк и две суммы частей md5 от текстового представления строки - сумма не зависит
+от порядка строк и считается самой базой, без передачи строк в Python (в SQLite md5 считает
+зарегистрированная функция). Несовпавший диапазон делится на 16 поддиапазонов, пока в нём не останется
+не больше leaf_rows строк; тогда строки диапазона сравниваются по id и выдаются точные различия.
+"""
+import hashlib
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import psycopg2
+
+from contexts import sqlite_conn_context
+
+HEX = '0123456789abcdef'
+LEAF_ROWS = 1000
+SKIP_FIELDS = ('created', 'modified')
+
+MISSING_IN_POSTGRES = 'missing in postgres'
+MISSING_IN_SQLITE = 'missing in sqlite'
+CHANGED = 'changed'
+
+
+@dataclass(frozen=True)
+class Difference:
+    id: str
+    kind: str
+
+
+def uuid_bound(prefix: str) -> str:
+    digits = prefix.ljust(32, '0')
+    return '{}-{}-{}-{}-{}'.format(digits[:8], digits[8:12], digits[12:16], digits[16:20], digits[20:])
+
+
+def next_prefix(prefix: str) -> Optional[str]:
+    stripped = prefix.rstrip('f')
+    if not stripped:
+        return None
+    return stripped[:-1] + HEX[HEX.index(stripped[-1]) + 1]
+
+
+def pg_text(value) -> str:
+    """Значение в том виде, в каком его выводит ::text в Postgres."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def row_md5(*values) -> str:
+    return hashlib.md5('|'.join(map(pg_text, values)).encode()).hexdigest()
+
+
+def hex_part(digest: str, start: int) -> int:
+    return int(digest[start:start + 8], 16)
+
+
+@dataclass
+class TableVerifier:
+    sqlite_conn: sqlite3.Connection
+    pg_conn: psycopg2.extensions.connection
+    cls: dataclass
+    leaf_rows: int = LEAF_ROWS
+
+    def __post_init__(self):
+        self.sqlite_conn.create_function('row_md5', -1, row_md5, deterministic=True)
+        self.sqlite_conn.create_function('hex_part', 2, hex_part, deterministic=True)
+        self.columns = [name for name in self.cls.__slots__ if name not in SKIP_FIELDS]
+
+    def ranges(self, prefix: str):
+        """Условие диапазона и его параметры для SQLite и для Postgres."""
+        if not prefix:
+            return '', '', []
+        bounds = [uuid_bound(prefix)]
+        sqlite_where, pg_where = ' WHERE id >= ?', ' WHERE id >= %s::uuid'
+        upper = next_prefix(prefix)
+        if upper is not None:
+            bounds.append(uuid_bound(upper))
+            sqlite_where += ' AND id < ?'
+            pg_where += ' AND id < %s::uuid'
+        return sqlite_where, pg_where, bounds
+
+    def digests(self, prefix: str):
+        sqlite_where, pg_where, bounds = self.ranges(prefix)
+        sqlite_digest = self.sqlite_conn.execute(
+            'SELECT count(*), coalesce(sum(hex_part(h, 0)), 0), coalesce(sum(hex_part(h, 8)), 0) '
+            'FROM (SELECT row_md5({columns}) AS h FROM {table}{where})'.format(
+                columns=', '.join(self.columns), table=self.cls.model, where=sqlite_where),
+            bounds,
+        ).fetchone()
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*), coalesce(sum(('x' || substr(h, 1, 8))::bit(32)::bigint), 0), "
+                "coalesce(sum(('x' || substr(h, 9, 8))::bit(32)::bigint), 0) "
+                "FROM (SELECT md5(concat_ws('|', {columns})) AS h FROM content.{table}{where}) AS s".format(
+                    columns=', '.join("coalesce({}::text, '\\N')".format(name) for name in self.columns),
+                    table=self.cls.model, where=pg_where),
+                bounds,
+            )
+            pg_digest = cursor.fetchone()
+        return tuple(map(int, sqlite_digest)), tuple(map(int, pg_digest))
+
+    def row_hashes(self, prefix: str):
+        sqlite_where, pg_where, bounds = self.ranges(prefix)
+        sqlite_rows = self.sqlite_conn.execute(
+            'SELECT id, row_md5({columns}) FROM {table}{where}'.format(
+                columns=', '.join(self.columns), table=self.cls.model, where=sqlite_where),
+            bounds,
+        ).fetchall()
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT id::text, md5(concat_ws('|', {columns})) FROM content.{table}{where}".format(
+                    columns=', '.join("coalesce({}::text, '\\N')".format(name) for name in self.columns),
+                    table=self.cls.model, where=pg_where),
+                bounds,
+            )
+            pg_rows = cursor.fetchall()
+        return dict(sqlite_rows), {row[0]: row[1] for row in pg_rows}
+
+    def compare(self, prefix: str = '') -> list:
+        sqlite_digest, pg_digest = self.digests(prefix)
+        if sqlite_digest == pg_digest:
+            return []
+        if max(sqlite_digest[0], pg_digest[0]) > self.leaf_rows and len(prefix) < 32:
+            return [difference for digit in HEX for difference in self.compare(prefix + digit)]
+        sqlite_rows, pg_rows = self.row_hashes(prefix)
+        differences = [Difference(id, MISSING_IN_POSTGRES) for id in sqlite_rows.keys() - pg_rows.keys()]
+        differences += [Difference(id, MISSING_IN_SQLITE) for id in pg_rows.keys() - sqlite_rows.keys()]
+        differences += [Difference(id, CHANGED) for id in sqlite_rows.keys() & pg_rows.keys()
+                        if sqlite_rows[id] != pg_rows[id]]
+        return sorted(differences, key=lambda difference: difference.id)
+
+
+def verify_tables(sqlite_path: str, pg_params: dict, classes, workers: int = 4,
+                  leaf_rows: int = LEAF_ROWS) -> dict:
+    """Сверяет таблицы параллельно, каждую на своих соединениях; возвращает различия по таблицам."""
+    def verify(cls):
+        with sqlite_conn_context(sqlite_path) as sqlite_conn:
+            pg_conn = psycopg2.connect(**pg_params)
+            try:
+                return cls.model, TableVerifier(sqlite_conn, pg_conn, cls, leaf_rows).compare()
+            finally:
+                pg_conn.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(verify, classes))
+
+
+if __name__ == '__main__':
+    from load_data import CLASSES, get_pg_params
+
+    for model, found in verify_tables('db.sqlite', get_pg_params(), CLASSES).items():
+        logging.info('%s: %s differences', model, len(found))
+        for difference in found:
+            logging.info('%s %s %s', model, difference.id, difference.kind)